@@ -1,81 +1,813 @@
-from random import randint
-from graph import Graph
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from itertools import accumulate, chain, islice, repeat
+from operator import add, eq, floordiv, mod, mul
+from random import Random
+from graph import Graph, FrozenGraph
 
 
 # EXTERNAL FUNCTIONS
 
-def create_random_graph(vertices, edges):
+def _sample_distinct(rng, space, count):
+    """
+    Returns count distinct integers from range(space)
+
+    When more than half of the range is requested the complement is sampled
+    instead, so the work stays proportional to min(count, space - count).
+    """
+    if count < 0:
+        raise ValueError("The number of edges can't be negative!")
+    if count > space:
+        raise ValueError("Too many edges!")
+    if 2 * count <= space:
+        return rng.sample(range(space), count)
+    excluded = set(rng.sample(range(space), space - count))
+    return [i for i in range(space) if i not in excluded]
+
+
+def create_random_graph(vertices, edges, seed=None):
     """
     Creates a random graph with the specified number of vertices and edges
+
+    The edges are drawn as distinct indices of the vertices * vertices possible
+    edges (index k is the edge (k // vertices, k % vertices)), so no pair is retried.
+    :param seed: the seed of the random generator, to get the same graph again
     """
+    rng = Random(seed)
     g = Graph(vertices)
-    edges_added = set()
-    while len(edges_added) < edges:
-        x, y, c = randint(0, vertices - 1), randint(0, vertices - 1), randint(0, 100)
-        if (x, y) not in edges_added:
-            g.add_edge(x, y, c)
-            edges_added.add((x, y))
+    indices = _sample_distinct(rng, vertices * vertices, edges)
+    costs = rng.choices(range(101), k=edges)
+    g.add_edges_from((k // vertices, k % vertices, c) for k, c in zip(indices, costs))
     return g
 
 
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "lzma"}  # first bytes of the files
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}  # used when writing
+
+
+def _compression_of(filename):
+    """
+    Returns the compression of an existing file from its first bytes: "gzip", "bz2", "lzma" or None
+    """
+    with open(filename, "rb") as f:
+        start = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def _open_for_reading(filename):
+    """
+    Opens a file for reading bytes, decompressing it on the fly if it is compressed
+
+    The decompressed bytes are streamed, they never go through a temporary file.
+    """
+    compression = _compression_of(filename)
+    if compression == "gzip":
+        return gzip.open(filename, "rb")
+    if compression == "bz2":
+        return bz2.open(filename, "rb")
+    if compression == "lzma":
+        return lzma.open(filename, "rb")
+    return open(filename, "rb")
+
+
+READ_CHUNK_SIZE = 1 << 20  # bytes of text parsed at a time
+
+
+def _read_edge_batches(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    Reads the edge lines "x y cost" from the rest of a binary file, one chunk at a time
+    :param f: a file opened in binary mode
+    :param chunk_size: the number of bytes read at a time
+    :return: an iterator of flat lists [x0, y0, cost0, x1, y1, cost1, ...], one per chunk
+    """
+    rest = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        cut = chunk.rfind(b"\n") + 1  # the last line may continue in the next chunk
+        rest = chunk[cut:]
+        numbers = list(map(int, chunk[:cut].split()))
+        if len(numbers) % 3 != 0:
+            raise ValueError("Every edge line must contain the two vertices and the cost!")
+        if numbers:
+            yield numbers
+
+    numbers = list(map(int, rest.split()))
+    if len(numbers) % 3 != 0:
+        raise ValueError("Every edge line must contain the two vertices and the cost!")
+    if numbers:
+        yield numbers
+
+
+def _read_header(f):
+    """
+    Reads the header of a graph file opened in binary mode
+    :return: the argument for the Graph constructor and whether the vertices of the edges
+             have to be added (format2 lists only the isolated vertices)
+    """
+    first = f.readline().split()
+    if not first:
+        raise ValueError("The file is empty!")
+    if first == [b"format2"]:
+        f.readline()  # the number of vertices and edges
+        return list(map(int, f.readline().split())), True
+    return int(first[0]), False
+
+
 def read_graph_from_file(filename):
     """
     Reads a graph from a file
+
+    Two formats are accepted:
+      - "n m" on the first line, the vertices being 0, 1, ..., n - 1
+      - "format2", then "n m", then the isolated vertices on one line; the other
+        vertices are the endpoints of the edges (this is what write_graph_to_file writes)
+    followed by one edge "x y cost" per line. The file is parsed in chunks of
+    READ_CHUNK_SIZE bytes, so its text is never held in memory as a whole. Files
+    compressed with gzip, bz2 or xz are decompressed while they are parsed.
     """
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-        form = lines[0].strip()
-        if form == 'format2':
-            l = lines[1].strip().split()
-            li = []
-            for i in l:
-                i = int(i)
-                li.append(i)
-            g = Graph(li)
-            for line in lines[2:]:
-                line = line.strip()
-                if line == "":
-                    continue
-                arguments = line.split()
-                x = int(arguments[0])
-                y = int(arguments[1])
-                cost = int(arguments[2])
-                g.add_edge(x, y, cost)
-        else:
-            l = lines[0].strip().split()
-            g = Graph(int(l[0]))
-            for line in lines[1:]:
-                line = line.strip()
-                if line == "":
-                    continue
-                arguments = line.split()
-                x = int(arguments[0])
-                y = int(arguments[1])
-                cost = int(arguments[2])
-                g.add_edge(x, y, cost)
+    with _open_for_reading(filename) as f:
+        vertices, add_endpoints = _read_header(f)
+        g = Graph(vertices)
+        for numbers in _read_edge_batches(f):
+            _add_edge_numbers(g, numbers, add_endpoints)
         return g
 
 
-def write_graph_to_file(g, filename):
+def _add_edge_numbers(g, numbers, add_endpoints):
+    """
+    Adds a batch of parsed edges to a graph being read
+    :param numbers: the flat sequence x0, y0, cost0, x1, y1, cost1, ...
+    :param add_endpoints: whether the missing endpoints are added first, in the order they appear
+    """
+    if add_endpoints:
+        for v in dict.fromkeys(chain.from_iterable(zip(numbers[0::3], numbers[1::3]))):
+            if not g.valid_vertex(v):
+                g.add_vertex(v)
+    _, rejected = g.add_edges_from(zip(numbers[0::3], numbers[1::3], numbers[2::3]))
+    if rejected:
+        raise ValueError(rejected[0][1])
+
+
+PARALLEL_RANGE_SIZE = 1 << 24  # bytes of edge lines parsed by a worker process at a time
+
+
+def _parse_byte_range(filename, begin, end):
+    """
+    Parses the edge lines that start in the bytes [begin, end) of a text graph file
+
+    This runs in the worker processes of read_graph_from_file_parallel.
+    :return: an array of 64-bit integers x0, y0, cost0, x1, y1, cost1, ...
+    """
+    with open(filename, "rb") as f:
+        f.seek(begin - 1)
+        if f.read(1) != b"\n":
+            f.readline()  # this line started in the previous range
+        data = f.read(max(0, end - f.tell()))
+        if data and not data.endswith(b"\n"):
+            data += f.readline()  # the last line ends in the next range
+    try:
+        numbers = array("q", map(int, data.split()))
+    except OverflowError:
+        raise ValueError("The vertices and the costs must be 64-bit integers!")
+    if len(numbers) % 3 != 0:
+        raise ValueError("Every edge line must contain the two vertices and the cost!")
+    return numbers
+
+
+def _sort_by_keys(keys, costs):
+    """
+    Returns the keys sorted ascending and the costs in the same order (both as arrays)
+    """
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return array("q", map(keys.__getitem__, order)), array("q", map(costs.__getitem__, order))
+
+
+def _sorted_edge_runs(rows, columns, costs, n, row_bounds):
+    """
+    Sorts edges between the vertex rows rows[i] and columns[i] by their keys row * n + column
+    and cuts the sorted run at the row bounds of the blocks of a FrozenGraph
+
+    This runs in the worker processes of read_graph_from_file_parallel(frozen=True).
+    :return: the runs of the outbound rows, then the runs of the inbound rows, as lists
+             with (keys, costs) per block
+    """
+    runs = []
+    for keys in (map(add, map(mul, rows, repeat(n)), columns), map(add, map(mul, columns, repeat(n)), rows)):
+        keys, sorted_costs = _sort_by_keys(array("q", keys), costs)
+        cuts = [bisect_left(keys, bound * n) for bound in row_bounds]
+        runs.append([(keys[a:b], sorted_costs[a:b]) for a, b in zip(cuts, cuts[1:])])
+    return runs
+
+
+def _parse_and_sort_byte_range(filename, begin, end, n, row_bounds):
+    """
+    Parses the edge lines of a byte range like _parse_byte_range, for a file whose vertices
+    are 0, 1, ..., n - 1, and returns them as the sorted runs of _sorted_edge_runs
+    """
+    numbers = _parse_byte_range(filename, begin, end)
+    xs, ys, costs = numbers[0::3], numbers[1::3], numbers[2::3]
+    for values in (xs, ys):
+        if values and not 0 <= min(values) <= max(values) < n:
+            v = next(v for v in values if not 0 <= v < n)
+            raise ValueError("The vertex {} doesn't exist!".format(v))
+    return _sorted_edge_runs(xs, ys, costs, n, row_bounds)
+
+
+def _csr_row_block(first_row, last_row, n, runs):
+    """
+    Merges the sorted runs of the edges of the rows [first_row, last_row) of a FrozenGraph
+
+    This runs in the worker processes of read_graph_from_file_parallel(frozen=True).
+    :return: the lengths of the rows, the column indices and the costs of their edges
+    """
+    keys, costs = array("q"), array("q")
+    for run_keys, run_costs in runs:
+        keys.extend(run_keys)
+        costs.extend(run_costs)
+    keys, costs = _sort_by_keys(keys, costs)  # timsort merges the sorted runs
+    if any(map(eq, keys[1:], keys[:-1])):
+        raise ValueError("The edge already exists!")
+    lengths = Counter(map(floordiv, keys, repeat(n)))
+    return array("q", map(lengths.__getitem__, range(first_row, last_row))), array("q", map(mod, keys, repeat(n))), costs
+
+
+def _join_row_blocks(blocks):
+    """
+    Joins the row blocks of _csr_row_block into the offsets, the column indices and the costs of all the rows
+    """
+    offsets, columns, costs = array("q", [0]), array("q"), array("q")
+    for lengths, block_columns, block_costs in blocks:
+        offsets.extend(map(add, accumulate(lengths), repeat(offsets[-1])))
+        columns.extend(block_columns)
+        costs.extend(block_costs)
+    return offsets, columns, costs
+
+
+def _read_frozen_graph_parallel(filename, bounds, workers, vertices, add_endpoints):
+    """
+    Reads the edge lines in the byte ranges between bounds into a FrozenGraph, see
+    read_graph_from_file_parallel
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as executor:
+        if add_endpoints:  # format2: the rows follow the vertices in the order they appear in the file
+            parts = list(executor.map(_parse_byte_range, repeat(filename), bounds, bounds[1:]))
+            endpoints = (chain.from_iterable(zip(part[0::3], part[1::3])) for part in parts)
+            vertices = list(dict.fromkeys(chain(vertices, chain.from_iterable(endpoints))))
+            n = len(vertices)
+            row_of = {v: i for i, v in enumerate(vertices)}
+            row_bounds = [n * i // workers for i in range(workers + 1)]
+            runs = list(executor.map(_sorted_edge_runs,
+                                     [array("q", map(row_of.__getitem__, part[0::3])) for part in parts],
+                                     [array("q", map(row_of.__getitem__, part[1::3])) for part in parts],
+                                     [part[2::3] for part in parts], repeat(n), repeat(row_bounds)))
+        else:
+            n, vertices = vertices, range(vertices)
+            row_bounds = [n * i // workers for i in range(workers + 1)]
+            runs = list(executor.map(_parse_and_sort_byte_range, repeat(filename), bounds, bounds[1:],
+                                     repeat(n), repeat(row_bounds)))
+
+        rows = []
+        for direction in (0, 1):  # outbound, inbound
+            block_runs = [[part[direction][block] for part in runs] for block in range(workers)]
+            rows.append(_join_row_blocks(executor.map(_csr_row_block, row_bounds, row_bounds[1:],
+                                                      repeat(n), block_runs)))
+    return FrozenGraph(vertices, *rows[0], *rows[1])
+
+
+def read_graph_from_file_parallel(filename, workers=None, frozen=False):
+    """
+    Reads a graph from a text file like read_graph_from_file, parsing it in worker processes
+
+    The edge lines are split into byte ranges of PARALLEL_RANGE_SIZE bytes aligned to line
+    boundaries, which the workers parse into packed integer arrays. The parent adds the
+    arrays to the graph in the order of the file, so the graph is identical to the one of
+    read_graph_from_file. At most two ranges per worker wait to be added, which bounds the
+    memory used. A compressed file can't be split, it is read by read_graph_from_file.
+
+    Only the parsing runs in parallel: the edges are added to a Graph one by one in the
+    parent, which takes most of the time. With frozen=True the result is a FrozenGraph,
+    equal to read_graph_from_file(filename).freeze(), built from the arrays in the workers:
+    each one sorts the edges of its byte ranges into runs cut at the bounds of blocks of
+    rows, then merges the runs of one block into its CSR rows, and the parent only joins
+    the blocks. The rows of a format2 file follow the order of the vertices in the whole
+    file, so there the parent maps the vertices to their rows first.
+    :param workers: the number of worker processes, os.cpu_count() by default
+    :param frozen: return a FrozenGraph instead of a Graph
+    """
+    from concurrent.futures import ProcessPoolExecutor  # imported here, it takes a third of the start up time
+
+    if _compression_of(filename) is not None:
+        g = read_graph_from_file(filename)
+        return g.freeze() if frozen else g
+    workers = workers or os.cpu_count() or 1
+    with open(filename, "rb") as f:
+        vertices, add_endpoints = _read_header(f)
+        start = f.tell()
+    size = os.path.getsize(filename)
+    bounds = list(range(start, size, PARALLEL_RANGE_SIZE)) + [size]
+    if frozen:
+        return _read_frozen_graph_parallel(filename, bounds, workers, vertices, add_endpoints)
+
+    g = Graph(vertices)
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for begin, end in zip(bounds, bounds[1:]):
+            pending.append(executor.submit(_parse_byte_range, filename, begin, end))
+            if len(pending) >= 2 * workers:
+                _add_edge_numbers(g, pending.popleft().result(), add_endpoints)
+        while pending:
+            _add_edge_numbers(g, pending.popleft().result(), add_endpoints)
+    return g
+
+
+WRITE_BUFFER_SIZE = 1 << 20  # bytes buffered before they are written to the file
+WRITE_BATCH_SIZE = 1 << 16  # edge lines formatted at a time
+GZIP_LEVEL = 1  # the fastest levels, compressing costs about as much as formatting the lines
+LZMA_PRESET = 0
+
+
+def _open_for_writing(filename, compression=None):
+    """
+    Opens a file for writing bytes, through a large buffer or a compressor
+    :param compression: "gzip", "bz2", "lzma", "none", or None to choose it from the
+                        extension of the file name (see COMPRESSION_EXTENSIONS)
+    """
+    if compression is None:
+        compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(filename)[1].lower(), "none")
+    if compression == "none":
+        return open(filename, "wb", buffering=WRITE_BUFFER_SIZE)
+    if compression == "gzip":
+        return gzip.open(filename, "wb", compresslevel=GZIP_LEVEL)
+    if compression == "bz2":
+        return bz2.open(filename, "wb")
+    if compression == "lzma":
+        return lzma.open(filename, "wb", preset=LZMA_PRESET)
+    raise ValueError(f"Unknown compression {compression}!")
+
+
+def write_graph_to_file(g, filename, compression=None):
+    """
+    Writes a graph to a file, in the format2 layout read by read_graph_from_file
+
+    The edges are read straight from the storage of the graph (Graph.parse_edges) and
+    formatted WRITE_BATCH_SIZE lines at a time by a single % operation.
+    :param g: a Graph or a FrozenGraph
+    :param compression: "gzip", "bz2", "lzma" or "none"; by default it follows the extension
+                        of the file name (.gz, .bz2, .xz)
+    """
+    edges = g.parse_edges()
+    with _open_for_writing(filename, compression) as f:
+        f.write(f"format2\n{g.number_of_vertices} {g.number_of_edges}\n".encode())
+        f.write("".join(f"{x} " for x in g.isolated_vertices()).encode() + b"\n")
+        while True:
+            batch = tuple(chain.from_iterable(islice(edges, WRITE_BATCH_SIZE)))  # x0, y0, cost0, x1, ...
+            if not batch:
+                break
+            f.write((("%s %s %s\n" * (len(batch) // 3)) % batch).encode())
+
+
+BINARY_MAGIC = b"DGRAPH01"
+BINARY_HEADER = struct.Struct("<8sqq")  # magic, number of vertices, number of edges
+
+
+def _write_int64(f, values):
+    """
+    Writes an array of integers as little-endian 64-bit values
+    """
+    if sys.byteorder != "little":
+        values = array("q", values)
+        values.byteswap()
+    f.write(values)
+
+
+def _int64_arrays(data, offset, lengths):
+    """
+    Returns views over consecutive little-endian 64-bit arrays of a buffer
+    :param data: a memoryview of bytes
+    :param offset: the position of the first array
+    :param lengths: the number of integers of every array
+    """
+    arrays = []
+    for length in lengths:
+        part = data[offset:offset + 8 * length].cast("q")
+        if sys.byteorder != "little":
+            part = array("q", part)
+            part.byteswap()
+        arrays.append(part)
+        offset += 8 * length
+    return arrays
+
+
+def is_binary_graph_file(filename):
+    """
+    Checks if a file (once decompressed) starts with the magic bytes of the binary graph format
+    """
+    with _open_for_reading(filename) as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _int64_vertices(vertices):
+    """
+    Packs the vertices of a graph into an array of 64-bit integers for the binary format
+    """
+    try:
+        return array("q", vertices)
+    except (TypeError, OverflowError):
+        raise ValueError("The binary format only stores 64-bit integer vertices!")
+
+
+def write_graph_to_binary_file(g, filename):
+    """
+    Writes a graph to a binary file, see read_graph_from_binary_file
+
+    The file holds a header (magic, n, m) followed by little-endian 64-bit arrays:
+    the n vertices, then out_offsets, out_targets, out_costs, in_offsets, in_sources
+    and in_costs of the compressed sparse row form of the graph (see Graph.freeze).
+    The file is compressed when its name ends in .gz, .bz2 or .xz.
+    Only 64-bit integer vertices can be stored: for any other label a ValueError is
+    raised before the file is opened.
+    :param g: a Graph or a FrozenGraph
+    """
+    frozen = g if isinstance(g, FrozenGraph) else g.freeze()
+    vertices = _int64_vertices(frozen.parse_vertices())
+    with _open_for_writing(filename) as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, frozen.number_of_vertices, frozen.number_of_edges))
+        _write_int64(f, vertices)
+        for part in frozen.csr_arrays():
+            _write_int64(f, part)
+
+
+def read_graph_from_binary_file(filename):
     """
-    Writes a graph to a file
+    Opens a file written by write_graph_to_binary_file as a FrozenGraph
+
+    The file is memory-mapped and the edge arrays are used in place, so opening does
+    not depend on the number of edges and processes reading the same file share it
+    through the page cache. A compressed file is decompressed in memory instead.
     """
-    with open(filename, "w") as f:
-        f.write("format2\n")
-        isolated = []
-        for v in g.parse_vertices():
-            if g.incoming_degree(v) == 0 and g.outgoing_degree(v) == 0:
-                isolated.append(v)
-        f.write(str(g.number_of_vertices) + " ")
-        no_edges = len(g.costs)
-        f.write(str(no_edges) + "\n")
-        vertices = ""
-        for x in isolated:
-            vertices = vertices + f"{x} "
-        f.write(vertices + "\n")
-        for x in g.parse_vertices():
-            for y in g.parse_outbound(x):
-                f.write(f"{x} {y} {g.get_cost_of_edge(x, y)}\n")
+    if _compression_of(filename) is None:
+        with open(filename, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        with _open_for_reading(filename) as f:
+            mapped = f.read()  # a compressed file can't be mapped, it is decompressed in memory
+    if len(mapped) < BINARY_HEADER.size:
+        raise ValueError(f"{filename} is not a binary graph file!")
+    magic, n, m = BINARY_HEADER.unpack_from(mapped)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{filename} is not a binary graph file!")
+    lengths = (n, n + 1, m, m, n + 1, m, m)
+    if len(mapped) != BINARY_HEADER.size + 8 * sum(lengths):
+        raise ValueError(f"The binary graph file {filename} is truncated!")
+    return FrozenGraph(*_int64_arrays(memoryview(mapped), BINARY_HEADER.size, lengths))
+
+
+def convert_graph_file(source, destination):
+    """
+    Converts a graph file from the text format to the binary format or the other way around
+
+    The format of the source is detected from its first bytes.
+    """
+    if is_binary_graph_file(source):
+        write_graph_to_file(read_graph_from_binary_file(source), destination)
+    else:
+        write_graph_to_binary_file(read_graph_from_file(source), destination)
+
+
+JOURNAL_SUFFIX = ".journal"  # the journal of the snapshot graph.txt is graph.txt.journal
+JOURNAL_MAGIC = b"GJOURN01"
+JOURNAL_HEADER = struct.Struct("<8sI")  # magic, crc32 of the snapshot the journal continues
+COMPACT_EVERY = 100000  # journal records after which the snapshot is rewritten
+
+ADD_VERTEX, REMOVE_VERTEX, ADD_EDGE, REMOVE_EDGE, CHANGE_COST = range(1, 6)
+JOURNAL_RECORDS = {  # opcode: the record, the opcode byte followed by little-endian 64-bit integers
+    ADD_VERTEX: struct.Struct("<Bq"),
+    REMOVE_VERTEX: struct.Struct("<Bq"),
+    ADD_EDGE: struct.Struct("<Bqqq"),
+    REMOVE_EDGE: struct.Struct("<Bqq"),
+    CHANGE_COST: struct.Struct("<Bqqq"),
+}
+JOURNAL_OPERATIONS = {  # opcode: the Graph method that replays the record
+    ADD_VERTEX: "add_vertex",
+    REMOVE_VERTEX: "remove_vertex",
+    ADD_EDGE: "add_edge",
+    REMOVE_EDGE: "remove_edge",
+    CHANGE_COST: "change_cost",
+}
+
+
+def _file_crc(filename):
+    """
+    Returns the crc32 of the bytes of a file
+    """
+    crc = 0
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _fsync_file(filename):
+    """
+    Forces the content of a file to the disk
+    """
+    with open(filename, "ab") as f:
+        os.fsync(f.fileno())
+
+
+def _replay_journal(g, data):
+    """
+    Applies the records of a journal (without its header) to a graph
+    :return: the number of records applied and the number of bytes they take; a record
+             cut by a crash at the end of the data is not applied
+    """
+    position = count = 0
+    while position < len(data):
+        record = JOURNAL_RECORDS.get(data[position])
+        if record is None:
+            raise ValueError(f"Unknown journal record at byte {JOURNAL_HEADER.size + position}!")
+        if position + record.size > len(data):
+            break
+        opcode, *arguments = record.unpack_from(data, position)
+        getattr(g, JOURNAL_OPERATIONS[opcode])(*arguments)
+        position += record.size
+        count += 1
+    return count, position
+
+
+class GraphJournal:
+    """
+    A graph saved as a snapshot file plus an append-only journal of the changes made since
+
+    The changes made through the journal are applied to the graph and appended to the
+    file <snapshot>.journal as small binary records (see JOURNAL_RECORDS), so saving a few
+    edits of a huge graph costs O(edits) instead of rewriting the file. Opening replays
+    the journal on the snapshot, and after compact_every records the snapshot is rewritten
+    and the journal starts again empty.
+
+    The header of the journal holds the crc32 of its snapshot. A compaction replaces the
+    snapshot before the journal, so after a crash in between the old journal doesn't match
+    the new snapshot (which already contains its changes) and it is ignored. A record cut
+    by a crash at the end of the journal is dropped.
+    """
+
+    def __init__(self, filename, graph=None, binary=False, compact_every=COMPACT_EVERY, sync=False):
+        """
+        Opens the graph saved in a snapshot file and its journal, creating them if needed
+        :param filename: the snapshot, a text or binary graph file
+        :param graph: the graph saved if the snapshot doesn't exist yet (an empty graph by default)
+        :param binary: whether a new snapshot is written in the binary format
+        :param compact_every: the number of journal records after which the snapshot is rewritten
+        :param sync: whether every record is forced to the disk (os.fsync) instead of only flushed
+        """
+        self._filename = filename
+        self._journal_filename = filename + JOURNAL_SUFFIX
+        self._compact_every = compact_every
+        self._sync = sync
+        self._file = None
+        self._records = 0
+
+        if not os.path.exists(filename):
+            self._binary = binary
+            self._graph = graph if graph is not None else Graph()
+            self.compact()
+            return
+
+        self._binary = is_binary_graph_file(filename)
+        self._graph = (read_graph_from_binary_file(filename).thaw() if self._binary
+                       else read_graph_from_file(filename))
+        crc = _file_crc(filename)
+        data = b""
+        if os.path.exists(self._journal_filename):
+            with open(self._journal_filename, "rb") as f:
+                data = f.read()
+        if data[:JOURNAL_HEADER.size] != JOURNAL_HEADER.pack(JOURNAL_MAGIC, crc):
+            self._start_journal(crc)  # no journal, or the one of an older snapshot
+            return
+        self._records, length = _replay_journal(self._graph, memoryview(data)[JOURNAL_HEADER.size:])
+        os.truncate(self._journal_filename, JOURNAL_HEADER.size + length)
+        self._file = open(self._journal_filename, "ab")
+
+    @property
+    def graph(self):
+        """
+        The graph; change it through the journal, changes made to it directly are not saved
+        """
+        return self._graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_journal(self, crc):
+        """
+        Replaces the journal with an empty one that continues the snapshot with the given crc32
+        """
+        temporary = self._journal_filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, crc))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._journal_filename)
+        self._file = open(self._journal_filename, "ab")
+        self._records = 0
+
+    def _append(self, opcode, *arguments):
+        """
+        Appends a record to the journal, compacting it when it got long enough
+        """
+        self._file.write(JOURNAL_RECORDS[opcode].pack(opcode, *arguments))
+        self._file.flush()
+        if self._sync:
+            os.fsync(self._file.fileno())
+        self._records += 1
+        if self._records >= self._compact_every:
+            self.compact()
+
+    def _check_record(self, opcode, *arguments):
+        """
+        Raises ValueError if a change can't be written to the journal, before it is made
+        """
+        try:
+            JOURNAL_RECORDS[opcode].pack(opcode, *arguments)
+        except struct.error:
+            raise ValueError("The journal only stores 64-bit integer vertices and costs!")
+
+    def add_vertex(self, vertex):
+        """
+        Adds a vertex to the graph and to the journal
+        """
+        self._check_record(ADD_VERTEX, vertex)
+        self._graph.add_vertex(vertex)
+        self._append(ADD_VERTEX, vertex)
+
+    def remove_vertex(self, vertex):
+        """
+        Removes a vertex from the graph and records it in the journal
+        """
+        self._check_record(REMOVE_VERTEX, vertex)
+        self._graph.remove_vertex(vertex)
+        self._append(REMOVE_VERTEX, vertex)
+
+    def add_edge(self, x, y, c):
+        """
+        Adds an edge to the graph and to the journal
+        """
+        self._check_record(ADD_EDGE, x, y, c)
+        self._graph.add_edge(x, y, c)
+        self._append(ADD_EDGE, x, y, c)
+
+    def remove_edge(self, x, y):
+        """
+        Removes an edge from the graph and records it in the journal
+        """
+        self._check_record(REMOVE_EDGE, x, y)
+        self._graph.remove_edge(x, y)
+        self._append(REMOVE_EDGE, x, y)
+
+    def change_cost(self, x, y, new_cost):
+        """
+        Changes the cost of an edge of the graph and records it in the journal
+        """
+        self._check_record(CHANGE_COST, x, y, new_cost)
+        self._graph.change_cost(x, y, new_cost)
+        self._append(CHANGE_COST, x, y, new_cost)
+
+    def compact(self):
+        """
+        Rewrites the snapshot with the current graph and starts an empty journal
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        root, extension = os.path.splitext(self._filename)
+        temporary = f"{root}.tmp{extension}"  # keeps the extension, which chooses the compression
+        if self._binary:
+            write_graph_to_binary_file(self._graph, temporary)
+        else:
+            write_graph_to_file(self._graph, temporary)
+        _fsync_file(temporary)
+        crc = _file_crc(temporary)
+        os.replace(temporary, self._filename)
+        self._start_journal(crc)
+
+    def close(self):
+        """
+        Forces the journal to the disk and closes it
+        """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+# SCRIPTED COMMANDS
+
+def _load_command(g, filename):
+    if is_binary_graph_file(filename):
+        return read_graph_from_binary_file(filename)
+    return read_graph_from_file(filename)
+
+
+def _random_command(g, vertices, edges, seed):
+    return create_random_graph(vertices, edges, seed)
+
+
+def _write_command(g, filename):
+    write_graph_to_file(g, filename)
+
+
+def _info_command(g):
+    print(f"{g.number_of_vertices} vertices, {g.number_of_edges} edges")
+
+
+GRAPH_COMMANDS = {  # name: (the function running it on the current graph, the types of its arguments)
+    "load": (_load_command, (str,)),
+    "random": (_random_command, (int, int, int)),
+    "write": (_write_command, (str,)),
+    "info": (_info_command, ()),
+}
+COMMANDS = GRAPH_COMMANDS  # all the commands of the program, redefined when it adds its own
+
+
+def run_commands(words, commands=None, g=None):
+    """
+    Runs a pipeline of commands on one graph, e.g. "load graph.txt info write copy.txt"
+
+    Every command takes a fixed number of arguments, so the commands simply follow each
+    other. A command returning a graph (load, random) replaces the current one; the others
+    work on it and print their answers, so the graph is read once for all of them.
+    :param words: the command names, each followed by its arguments
+    :param commands: the available commands (see GRAPH_COMMANDS), COMMANDS by default
+    :param g: the graph to start with (an empty graph by default)
+    :return: the graph after the last command
+    """
+    commands = COMMANDS if commands is None else commands
+    g = Graph() if g is None else g
+    position = 0
+    while position < len(words):
+        name = words[position]
+        if name not in commands:
+            raise ValueError(f"Unknown command {name}! The commands are: {', '.join(commands)}")
+        function, types = commands[name]
+        arguments = words[position + 1:position + 1 + len(types)]
+        if len(arguments) < len(types):
+            raise ValueError(f"The command {name} takes {len(types)} arguments!")
+        result = function(g, *(convert(argument) for convert, argument in zip(types, arguments)))
+        if result is not None:
+            g = result
+        position += 1 + len(types)
+    return g
+
+
+def command_line(arguments, commands=None):
+    """
+    Runs the commands given on the command line (see run_commands) without the menu
+
+    An argument "@jobs.txt" stands for the words of that file, so long pipelines can be
+    kept in a file with one command per line ("#" starts a comment).
+    :param commands: the available commands, COMMANDS by default
+    :return: the exit status of the program
+    """
+    commands = COMMANDS if commands is None else commands
+    words = []
+    for argument in arguments:
+        if argument.startswith("@"):
+            with open(argument[1:]) as f:
+                words.extend(word for line in f for word in line.split("#", 1)[0].split())
+        else:
+            words.append(argument)
+    if words[:1] in (["-h"], ["--help"], ["help"]):
+        usage = ", ".join(f"{name} {' '.join(t.__name__.upper() for t in types)}".strip()
+                          for name, (_, types) in commands.items())
+        print(f"Commands: {usage}")
+        return 0
+    try:
+        run_commands(words, commands)
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
 
 
 class UI:
@@ -126,6 +858,9 @@ class UI:
         except:
             print("Invalid numbers!")
             return
+        if vertices < 0 or edges < 0:
+            print("The numbers of vertices and edges can't be negative!")
+            return
         if edges > (vertices * vertices):
             print("Too many edges!")
             return
@@ -337,4 +1072,7 @@ class UI:
                 print("Invalid option!")
 
 
-UI().main()
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(command_line(sys.argv[1:]))
+    UI().main()
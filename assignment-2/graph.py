@@ -1,20 +1,311 @@
+import cProfile
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from contextlib import contextmanager
+from functools import wraps
+from itertools import compress, groupby
+from operator import itemgetter
+from time import perf_counter
+
+
+class VertexIndex:
+    def __init__(self, labels=()):
+        """
+        Interns the vertices of a graph (any hashable labels) as dense integer ids 0, 1, 2, ...
+        The ids of removed vertices are reused, so they stay below the largest number
+        of vertices the graph ever had.
+        :param labels: the initial labels, they get the ids 0, 1, ... in order
+        """
+        self._ids = {}
+        self._labels = []
+        self._free_ids = []
+        for label in labels:
+            self.add(label)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, label):
+        return label in self._ids
+
+    @property
+    def capacity(self):
+        """
+        The number of ids handed out so far, free or in use
+        """
+        return len(self._labels)
+
+    def get(self, label, default=None):
+        """
+        Returns the id of a label, or default if the label is not interned
+        """
+        return self._ids.get(label, default)
+
+    def label_of(self, i):
+        """
+        Returns the label of an id
+        """
+        return self._labels[i]
+
+    @property
+    def label_lookup(self):
+        """
+        The function id -> label as a builtin (list.__getitem__), cheap to map over many ids
+        """
+        return self._labels.__getitem__
+
+    def labels_of(self, ids):
+        """
+        Returns the list of the labels of some ids
+        """
+        labels = self._labels
+        return [labels[i] for i in ids]
+
+    def labels(self):
+        """
+        Returns the labels, in the order they were added
+        """
+        return self._ids.keys()
+
+    def items(self):
+        """
+        Returns the (label, id) pairs, in the order the labels were added
+        """
+        return self._ids.items()
+
+    def add(self, label):
+        """
+        Interns a new label and returns its id
+        """
+        if self._free_ids:
+            i = self._free_ids.pop()
+            self._labels[i] = label
+        else:
+            i = len(self._labels)
+            self._labels.append(label)
+        self._ids[label] = i
+        return i
+
+    def remove(self, label):
+        """
+        Forgets a label and returns its id, which will be reused
+        """
+        i = self._ids.pop(label)
+        self._labels[i] = None
+        self._free_ids.append(i)
+        return i
+
+    def copy(self):
+        """
+        Returns an independent copy of the index
+        """
+        index = VertexIndex()
+        index._ids = dict(self._ids)
+        index._labels = list(self._labels)
+        index._free_ids = list(self._free_ids)
+        return index
+
+
+class DisjointSet:
+    """
+    A disjoint-set forest (union by rank, path compression): find and union take
+    nearly constant amortized time. Ranks and sizes are kept only for the roots,
+    so the sizes of all the sets are available without a pass over the elements.
+    """
+
+    def __init__(self, elements=()):
+        """
+        Puts every element in a set of its own
+        :param elements: an iterable of hashable elements
+        """
+        self._parent = {x: x for x in elements}
+        self._rank = dict.fromkeys(self._parent, 0)
+        self._size = dict.fromkeys(self._parent, 1)
+
+    def __contains__(self, x):
+        return x in self._parent
+
+    def __len__(self):
+        return len(self._parent)
+
+    def add(self, x):
+        """
+        Adds x in a set of its own, if it is not there yet
+        """
+        if x not in self._parent:
+            self._parent[x] = x
+            self._rank[x] = 0
+            self._size[x] = 1
+
+    def remove(self, x):
+        """
+        Removes an element that is alone in its set
+
+        :param x: The element to remove
+        :return: None
+        """
+        if self._parent.get(x) != x or self._size[x] != 1:
+            raise ValueError(f"The element {x} is not alone in its set!")
+        del self._parent[x], self._rank[x], self._size[x]
+
+    def find(self, x):
+        """
+        Returns the root of the set of x, pointing every element on the way
+        straight at it
+        """
+        parent = self._parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        """
+        Merges the sets of x and y, attaching the lower ranked root under the other
+
+        :return: True if they were in different sets, False otherwise
+        """
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return False
+        rank = self._rank
+        if rank[x] < rank[y]:
+            x, y = y, x
+        elif rank[x] == rank[y]:
+            rank[x] += 1
+        self._parent[y] = x
+        self._size[x] += self._size.pop(y)
+        del rank[y]
+        return True
+
+    def sizes(self):
+        """
+        Returns a dictionary {root: size of its set}
+        """
+        return dict(self._size)
+
+
+class _EdgesView(Mapping):
+    """
+    Read-only dict-like view graph.edge_key(x, y) -> cost over the storage of a Graph,
+    listing every edge once
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        x, y = edge
+        graph = self._graph
+        xi, yi = graph._index.get(x), graph._index.get(y)
+        if xi is None or yi is None or yi not in graph._neighbors[xi] or not graph._keyed_in_order(x, y, xi, yi):
+            raise KeyError(edge)
+        return graph._cost_values[graph._neighbors[xi][yi]]
+
+    def __iter__(self):
+        graph = self._graph
+        label = graph._index.label_lookup
+        return compress(zip(map(label, graph._first), map(label, graph._second)), graph._used)
+
+    def __len__(self):
+        return self._graph.number_of_edges
+
+    def items(self):
+        """
+        Returns an iterator of the (edge, cost) pairs, walking the slots in C
+        """
+        graph = self._graph
+        label = graph._index.label_lookup
+        edges = zip(map(label, graph._first), map(label, graph._second))
+        return compress(zip(edges, graph._cost_values), graph._used)
+
+
+class GraphBatch:
+    """
+    Changes of a graph collected by Graph.batch() and applied together when the with block ends
+
+    The changes are applied in order, the runs of add_edge and of remove_edge going through
+    add_edges_from / remove_edges_from, while an undo log keeps the inverse of every applied
+    change. If a change fails, the log is replayed backwards and its error is raised: the graph
+    has its vertices, edges and costs from before the batch again. Nothing is applied if the
+    with block raises.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._changes = []  # (name of the Graph method, arguments)
+        self._record = self._changes.append
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        changes, self._changes, self._record = self._changes, None, self._closed
+        if exc_type is None:
+            self._graph._apply_batch(changes)
+        return False
+
+    @staticmethod
+    def _closed(change):
+        raise RuntimeError("The batch was already applied!")
+
+    def add_vertex(self, new_vertex):
+        self._record(("add_vertex", (new_vertex,)))
+
+    def remove_vertex(self, vertex_to_delete):
+        self._record(("remove_vertex", (vertex_to_delete,)))
+
+    def add_edge(self, x, y, c):
+        self._record(("add_edge", (x, y, c)))
+
+    def remove_edge(self, x, y):
+        self._record(("remove_edge", (x, y)))
+
+    def change_cost(self, x, y, new_cost):
+        self._record(("change_cost", (x, y, new_cost)))
+
+
 class Graph:
     def __init__(self, vertices=None, edges=None):
         """
         Constructor for the graph initializes
         :param vertices: either the number of vertices or a list of vertices
-        :param edges: the edges
+        :param edges: the edges, a dictionary {(x, y): cost}; (x, y) and (y, x) are the same edge
         """
-        self._edges = edges if edges is not None else {}
-
         if not vertices:
-            self._vertices = set()
-        else:
-            if isinstance(vertices, int):
-                self._vertices = set(range(vertices))
-            elif isinstance(vertices, (list, set)):
-                self._vertices = set(vertices)
+            vertices = ()
+        elif isinstance(vertices, int):
+            vertices = range(vertices)
 
+        # the vertices are interned as dense ids and everything else is stored by id:
+        # _neighbors[i] maps the neighbor ids of vertex i to the slot of the cost of their edge
+        # in _cost_values (None for a free id); an edge is in the dicts of both of its vertices
+        # (a loop once), so no method scans all the edges
+        self._index = VertexIndex(dict.fromkeys(vertices))
+        self._neighbors = [{} for _ in range(self._index.capacity)]
+        self._cost_values = array('q')  # 64-bit costs, one slot per edge
+        self._first = []  # slot: the id of edge_key(x, y)[0] of its edge, so the edges are listed without the dicts
+        self._second = []  # slot: the id of edge_key(x, y)[1]
+        self._used = bytearray()  # slot: 1 while it holds an edge
+        self._free_slots = []  # slots of removed edges, reused first
+        if edges:
+            neighbors = self._neighbors
+            for (x, y), c in edges.items():
+                xi, yi = self._intern(x), self._intern(y)
+                slot = neighbors[xi].get(yi)
+                if slot is not None:
+                    self._set_cost(slot, c)
+                else:
+                    neighbors[xi][yi] = neighbors[yi][xi] = self._store_edge(x, y, xi, yi, c)
+        # the ids of the vertices without neighbors, kept in step with _neighbors
+        self._isolated = {i for _, i in self._index.items() if not self._neighbors[i]}
+        # DisjointSet of the connected components (by id), built by the first query about them and
+        # kept up to date when vertices and edges are added; None while it has to be rebuilt
+        self._components = None
 
     def __str__(self):
         """
@@ -22,54 +313,79 @@ class Graph:
         """
         graph = ["Undirected Graph Adjacency List:"]
 
-        for vertex in self._vertices:
-            neighbors = " ".join(map(str, self.get_neighbors(vertex)))
+        label = self._index.label_lookup
+        for vertex, i in self._index.items():
+            neighbors = " ".join(map(str, map(label, self._neighbors[i])))
             graph.append(f"{vertex}: {neighbors}")
 
         return "\n".join(graph)
 
+    def _intern(self, vertex):
+        """
+        Returns the id of a vertex, adding it without edges if it is new
+        """
+        i = self._index.get(vertex)
+        if i is None:
+            i = self._index.add(vertex)
+            if i == len(self._neighbors):
+                self._neighbors.append({})
+            else:
+                self._neighbors[i] = {}
+        return i
+
     # GETTERS AND SETTERS
     @property
     def vertices(self):
-        return self._vertices
+        """
+        A read-only set-like view of the vertices, in the order they were added
+        """
+        return self._index.labels()
 
     @property
     def number_of_vertices(self):
-        return len(self._vertices)
+        return len(self._index)
 
     @property
     def edges(self):
-        return self._edges
+        """
+        A read-only mapping {edge_key(x, y): cost} with every edge once
+        """
+        return _EdgesView(self)
 
     @property
     def number_of_edges(self):
-        return len(self._edges)
+        return len(self._cost_values) - len(self._free_slots)
 
     def get_cost_of_edge(self, x, y):
         """
         Returns the cost of an edge
         """
-        if not self.vertex_exists(x):
+        xi = self._index.get(x)
+        if xi is None:
             raise ValueError(f'The vertex {x} not in graph!')
-        if not self.vertex_exists(y):
+        yi = self._index.get(y)
+        if yi is None:
             raise ValueError(f'The vertex {y} not in graph!')
-        if not self.edge_exists(x, y):
+        slot = self._neighbors[xi].get(yi)
+        if slot is None:
             raise ValueError(f'The edge ({x}, {y}) is not in the graph!')
 
-        return self._edges[(x, y)]
+        return self._cost_values[slot]
 
     def change_cost(self, x, y, new_cost):
         """
         Changes the cost of the edge between x and y
         """
-        if not self.vertex_exists(x):
+        xi = self._index.get(x)
+        if xi is None:
             raise ValueError(f"The vertex {x} is not in the graph!")
-        if not self.vertex_exists(y):
+        yi = self._index.get(y)
+        if yi is None:
             raise ValueError(f"The vertex {y} is not in the graph!")
 
-        if (x, y) in self._edges:
-            self._edges[(x, y)] = new_cost
-            self._edges[(y, x)] = new_cost
+        slot = self._neighbors[xi].get(yi)
+        if slot is not None:
+            self._set_cost(slot, new_cost)
         else:
             raise ValueError(f"The edge ({x},{y})/({y},{x}) doesn't exist!")
 
@@ -80,7 +396,7 @@ class Graph:
         :param vertex: The vertex to find
         :return: True if the vertex exists, False otherwise
         """
-        return vertex in self._vertices
+        return vertex in self._index
 
     def edge_exists(self, x, y):
         """
@@ -90,22 +406,50 @@ class Graph:
         :param y: The second vertex of the edge
         :return: True if the edge exists, False otherwise
         """
-        return (x, y) in self._edges
+        xi, yi = self._index.get(x), self._index.get(y)
+        return xi is not None and yi is not None and yi in self._neighbors[xi]
+
+    def edge_key(self, x, y):
+        """
+        Returns the key of the edge between x and y in graph.edges: the same for (x, y)
+        and (y, x), with the smaller vertex first, or the one with the smaller internal
+        id when x and y can't be compared (e.g. 'a' and 1)
+
+        :param x: The first vertex of the edge
+        :param y: The second vertex of the edge
+        :return: The pair (x, y) or (y, x)
+        """
+        xi = self._index.get(x)
+        if xi is None:
+            raise ValueError(f"The vertex {x} doesn't exist!")
+        yi = self._index.get(y)
+        if yi is None:
+            raise ValueError(f"The vertex {y} doesn't exist!")
+        return (x, y) if self._keyed_in_order(x, y, xi, yi) else (y, x)
+
+    @staticmethod
+    def _keyed_in_order(x, y, xi, yi):
+        """
+        Returns True if the edge between x and y (with the ids xi and yi) is keyed (x, y):
+        a total order on the endpoints, even for labels of different types
+        """
+        try:
+            if x <= y:
+                return True
+            if y <= x:
+                return False
+        except TypeError:
+            pass
+        return xi <= yi
 
     def get_neighbors(self, v):
         """
         Returns the list of neighbors of a vertex
         """
-        if not self.vertex_exists(v):
+        i = self._index.get(v)
+        if i is None:
             raise ValueError("The vertex {} doesn't exist!".format(v))
-        neighbors = set()
-        for edge in self._edges:
-            if edge[0] == v:
-                neighbors.add(edge[1])
-            elif edge[1] == v:
-                neighbors.add(edge[0])
-
-        return neighbors
+        return set(map(self._index.label_lookup, self._neighbors[i]))
 
     # ADD & REMOVE VERTEX
     def add_vertex(self, new_vertex):
@@ -115,28 +459,90 @@ class Graph:
         if self.vertex_exists(new_vertex):
             raise ValueError(f"The vertex {new_vertex} already exists!")
 
-        self._vertices.add(new_vertex)
+        i = self._intern(new_vertex)
+        self._isolated.add(i)
+        if self._components is not None:
+            self._components.add(i)
 
     def remove_vertex(self, vertex_to_delete):
         """
         Removes a vertex from the graph, removing all edges
         associated with it
 
+        Only the edges of the vertex are visited (through the
+        neighbor index), so it takes O(degree) time.
+
         :param vertex_to_delete: The vertex to delete
         :return: None
         """
-        if not self.vertex_exists(vertex_to_delete):
+        i = self._index.get(vertex_to_delete)
+        if i is None:
             raise ValueError(f"The vertex {vertex_to_delete} doesn't exist!")
 
-        edges_to_delete = []
-        for edge in self._edges:
-            if vertex_to_delete in edge:
-                edges_to_delete.append(edge)
+        vertex_neighbors = self._neighbors[i]
+        for slot in vertex_neighbors.values():
+            self._free_slot(slot)
+        for neighbor in vertex_neighbors:
+            if neighbor != i:
+                del self._neighbors[neighbor][i]
+                if not self._neighbors[neighbor]:
+                    self._isolated.add(neighbor)
+
+        self._neighbors[i] = None
+        self._index.remove(vertex_to_delete)
+        self._isolated.discard(i)
+        if self._components is not None:
+            if vertex_neighbors:
+                self._components = None
+            else:
+                self._components.remove(i)
+
+    def remove_vertices(self, vertices):
+        """
+        Removes many vertices at once, with all their edges, skipping
+        and reporting the ones that can't be removed
+
+        A single pass goes over the neighbors of the removed vertices;
+        an edge between two of them is deleted once, when the first
+        one is removed.
 
-        for edge in edges_to_delete:
-            del self._edges[edge]
+        :param vertices: An iterable of vertices
+        :return: The number of removed vertices and a list of
+                 (vertex, message) for the rejected ones
+        """
+        vertices = list(vertices)  # the iterable may be a view of this graph
+        index = self._index
+        neighbors = self._neighbors
+        free_slot = self._free_slot
+        isolated = self._isolated
+        components = self._components
 
-        self._vertices.remove(vertex_to_delete)
+        removed = 0
+        rejected = []
+        for v in vertices:
+            i = index.get(v)
+            if i is None:
+                rejected.append((v, f"The vertex {v} doesn't exist!"))
+                continue
+            vertex_neighbors = neighbors[i]
+            neighbors[i] = None
+            if components is not None:
+                if vertex_neighbors:
+                    components = self._components = None
+                else:
+                    components.remove(i)
+            for slot in vertex_neighbors.values():
+                free_slot(slot)
+            for neighbor in vertex_neighbors:
+                if neighbor != i:
+                    neighbor_neighbors = neighbors[neighbor]
+                    del neighbor_neighbors[i]
+                    if not neighbor_neighbors:
+                        isolated.add(neighbor)
+            index.remove(v)
+            isolated.discard(i)
+            removed += 1
+        return removed, rejected
 
     # ADD & REMOVE EDGE
     def add_edge(self, x, y, c):
@@ -150,15 +556,23 @@ class Graph:
         :param c: The cost of the edge
         :return: None
         """
-        if not self.vertex_exists(x):
+        xi = self._index.get(x)
+        if xi is None:
             raise ValueError(f"The vertex {x} doesn't exist!")
 
-        if not self.vertex_exists(y):
+        yi = self._index.get(y)
+        if yi is None:
             raise ValueError(f"The vertex {y} doesn't exist!")
 
-
-        self._edges[(x, y)] = c
-        self._edges[(y, x)] = c
+        slot = self._neighbors[xi].get(yi)
+        if slot is not None:
+            self._set_cost(slot, c)
+            return
+        self._neighbors[xi][yi] = self._neighbors[yi][xi] = self._store_edge(x, y, xi, yi, c)
+        self._isolated.discard(xi)
+        self._isolated.discard(yi)
+        if self._components is not None:
+            self._components.union(xi, yi)
 
     def remove_edge(self, x, y):
         """
@@ -168,18 +582,113 @@ class Graph:
         :param y: The second vertex
         :return: None
         """
-        if not self.vertex_exists(x):
+        xi = self._index.get(x)
+        if xi is None:
             raise ValueError(f"The vertex {x} doesn't exist!")
 
-        if not self.vertex_exists(y):
+        yi = self._index.get(y)
+        if yi is None:
             raise ValueError(f"The vertex {y} doesn't exist!")
 
-        if (x, y) in self._edges:
-            del self._edges[(x, y)]
-            del self._edges[(y, x)]
+        x_neighbors = self._neighbors[xi]
+        if yi in x_neighbors:
+            self._free_slot(x_neighbors.pop(yi))
+            self._neighbors[yi].pop(xi, None)  # already gone for a loop
+            if not x_neighbors:
+                self._isolated.add(xi)
+            if not self._neighbors[yi]:
+                self._isolated.add(yi)
+            self._components = None
         else:
             raise ValueError(f"The edge ({x}, {y}) doesn't exist!")
 
+    def add_edges_from(self, edges):
+        """
+        Adds many edges at once
+
+        The endpoints of every edge are looked up once and the edges are
+        added in one pass. Invalid edges do not raise: they are skipped
+        and reported. Unlike add_edge, an edge that is already in the
+        graph (or earlier in the batch) is rejected instead of getting
+        its cost updated.
+
+        :param edges: An iterable of (x, y, cost) triples
+        :return: The number of added edges and a list of
+                 ((x, y, cost), message) for the rejected ones
+        """
+        get = self._index._ids.get  # the dict's own get, without a Python call per endpoint
+        neighbors = self._neighbors
+        store_edge = self._store_edge
+        isolated = self._isolated
+        components = self._components
+
+        added = 0
+        rejected = []
+        for edge in edges:
+            x, y, c = edge
+            xi, yi = get(x), get(y)
+            if xi is None or yi is None:
+                v = x if xi is None else y
+                rejected.append((edge, f"The vertex {v} doesn't exist!"))
+                continue
+            x_neighbors = neighbors[xi]
+            if yi in x_neighbors:
+                rejected.append((edge, f"The edge ({x}, {y}) already exists!"))
+                continue
+            try:
+                slot = store_edge(x, y, xi, yi, c)
+            except ValueError as e:
+                rejected.append((edge, str(e)))
+                continue
+            x_neighbors[yi] = neighbors[yi][xi] = slot
+            if isolated:
+                isolated.discard(xi)
+                isolated.discard(yi)
+            if components is not None:
+                components.union(xi, yi)
+            added += 1
+        return added, rejected
+
+    def remove_edges_from(self, edges):
+        """
+        Removes many edges at once, skipping and reporting the ones
+        that can't be removed
+
+        :param edges: An iterable of (x, y) pairs
+        :return: The number of removed edges and a list of
+                 ((x, y), message) for the rejected ones
+        """
+        get = self._index._ids.get  # the dict's own get, without a Python call per endpoint
+        neighbors = self._neighbors
+        free_slot = self._free_slot
+        isolated = self._isolated
+
+        removed = 0
+        rejected = []
+        for edge in edges:
+            x, y = edge
+            xi, yi = get(x), get(y)
+            if xi is None or yi is None:
+                v = y if xi is not None else x
+                rejected.append((edge, f"The vertex {v} doesn't exist!"))
+                continue
+            x_neighbors = neighbors[xi]
+            slot = x_neighbors.pop(yi, None)
+            if slot is None:
+                rejected.append((edge, f"The edge ({x}, {y}) doesn't exist!"))
+                continue
+            free_slot(slot)
+            y_neighbors = neighbors[yi]
+            y_neighbors.pop(xi, None)  # already gone for a loop
+            if not x_neighbors:
+                isolated.add(xi)
+            if not y_neighbors:
+                isolated.add(yi)
+            removed += 1
+        if removed:
+            self._components = None
+        return removed, rejected
+
     # DEGREE
     def degree(self, vertex) -> int:
         """
@@ -190,18 +699,381 @@ class Graph:
         :param vertex: The vertex to get the degree of
         :return: The degree of the vertex
         """
-        return len(self.get_neighbors(vertex))
+        i = self._index.get(vertex)
+        if i is None:
+            raise ValueError("The vertex {} doesn't exist!".format(vertex))
+        return len(self._neighbors[i])
+
+    def degrees(self):
+        """
+        Returns the degrees of all the vertices, as an array in the
+        order of graph.vertices
+        """
+        ids = map(itemgetter(1), self._index.items())
+        return array('q', map(len, map(self._neighbors.__getitem__, ids)))
 
     def isolated_vertices(self):
         """
         Returns a list of isolated vertices
+
+        The set of isolated vertices is kept up to date by every
+        change, so this takes O(k) time for k isolated vertices.
+        """
+        return list(map(self._index.label_lookup, self._isolated))
+
+    # CONNECTED COMPONENTS
+    def _component_index(self):
+        """
+        Returns the DisjointSet of the connected components (of the vertex ids),
+        building it in O(V + E) time if an edge was removed since the last query
+        """
+        if self._components is None:
+            components = DisjointSet(map(itemgetter(1), self._index.items()))
+            union = components.union
+            for xi, yi in compress(zip(self._first, self._second), self._used):
+                union(xi, yi)
+            self._components = components
+        return self._components
+
+    def same_component(self, x, y):
+        """
+        Checks if there is a walk between two vertices
+
+        :param x: The first vertex
+        :param y: The second vertex
+        :return: True if x and y are in the same connected component, False otherwise
+        """
+        xi = self._index.get(x)
+        if xi is None:
+            raise ValueError(f"The vertex {x} doesn't exist!")
+        yi = self._index.get(y)
+        if yi is None:
+            raise ValueError(f"The vertex {y} doesn't exist!")
+        find = self._component_index().find
+        return find(xi) == find(yi)
+
+    def component_of(self, v):
+        """
+        Returns the representative of the connected component of a vertex: a
+        vertex of the component, the same for all of them until the graph changes
+
+        :param v: The vertex
+        :return: The representative vertex
+        """
+        i = self._index.get(v)
+        if i is None:
+            raise ValueError(f"The vertex {v} doesn't exist!")
+        return self._index.label_of(self._component_index().find(i))
+
+    def components(self):
+        """
+        Returns a dictionary {representative: set of vertices} with an entry
+        for every connected component, in the order of their first vertex in
+        graph.vertices
+        """
+        find = self._component_index().find
+        components = {}
+        for v, i in self._index.items():
+            root = find(i)
+            if root in components:
+                components[root].add(v)
+            else:
+                components[root] = {v}
+        label = self._index.label_lookup
+        return {label(root): vertices for root, vertices in components.items()}
+
+    def component_sizes(self):
+        """
+        Returns a dictionary {representative: number of vertices} with an entry
+        for every connected component
         """
-        return [v for v in self._vertices if self.degree(v) == 0]
+        label = self._index.label_lookup
+        return {label(root): size for root, size in self._component_index().sizes().items()}
 
     def copy_graph(self):
         """
         Returns a copy of the graph
         """
-        vertices_copy = self._vertices.copy()
-        edges_copy = self._edges.copy()
-        return Graph(vertices_copy, edges_copy)
+        copy = Graph()
+        copy._index = self._index.copy()
+        copy._neighbors = [None if neighbors is None else neighbors.copy() for neighbors in self._neighbors]
+        copy._cost_values = array('q', self._cost_values)
+        copy._first = list(self._first)
+        copy._second = list(self._second)
+        copy._used = bytearray(self._used)
+        copy._free_slots = list(self._free_slots)
+        copy._isolated = set(self._isolated)
+        return copy
+
+    # BATCHES
+    def batch(self):
+        """
+        Returns a GraphBatch, to make many changes at once and atomically:
+            with graph.batch() as b:
+                b.add_edge(x, y, c)
+                b.remove_edge(u, v)
+        """
+        return GraphBatch(self)
+
+    def _apply_batch(self, changes):
+        """
+        Applies the changes of a GraphBatch, all of them or (if one fails) none
+        """
+        undo = []  # (name of the Graph method, arguments) undoing the changes applied so far
+        try:
+            for name, group in groupby(changes, key=itemgetter(0)):
+                arguments = list(map(itemgetter(1), group))
+                if len(arguments) == 1 or name not in ("add_edge", "remove_edge"):
+                    for a in arguments:
+                        self._apply_change(name, a, undo)
+                elif name == "add_edge":
+                    _, rejected = self.add_edges_from(arguments)
+                    added = ((x, y) for x, y, _ in self._accepted(arguments, rejected))
+                    undo.append(("remove_edges_from", (added,)))
+                    # add_edge updates the cost of an existing edge where add_edges_from rejects
+                    # it, so those edges get their costs now, in order, until a real failure
+                    for edge, message in rejected:
+                        if not self.edge_exists(edge[0], edge[1]):
+                            raise ValueError(message)
+                        self._apply_change("add_edge", edge, undo)
+                else:
+                    removed, rejected = self.remove_edges_from(arguments)
+                    # the slots of the removed edges were freed in order and still hold their costs
+                    free_slots = self._free_slots
+                    costs = array('q', map(self._cost_values.__getitem__, free_slots[len(free_slots) - removed:]))
+                    restored = ((x, y, c) for (x, y), c in zip(self._accepted(arguments, rejected), costs))
+                    undo.append(("add_edges_from", (restored,)))
+                    if rejected:
+                        raise ValueError(rejected[0][1])
+        except Exception:
+            for name, arguments in reversed(undo):
+                getattr(self, name)(*arguments)
+            raise
+
+    def _apply_change(self, name, arguments, undo):
+        """
+        Makes one change of a GraphBatch and appends the changes undoing it to the undo log of _apply_batch
+        """
+        if name == "add_vertex":
+            self.add_vertex(*arguments)
+            undo.append(("remove_vertex", arguments))
+        elif name == "remove_vertex":
+            v = arguments[0]
+            i = self._index.get(v)
+            if i is None:
+                raise ValueError(f"The vertex {v} doesn't exist!")
+            label = self._index.label_lookup
+            values = self._cost_values
+            edges = [(v, label(neighbor), values[slot]) for neighbor, slot in self._neighbors[i].items()]
+            self.remove_vertex(v)
+            undo.append(("add_edges_from", (edges,)))  # replayed backwards: after the vertex is back
+            undo.append(("add_vertex", (v,)))
+        else:
+            x, y = arguments[0], arguments[1]
+            xi, yi = self._index.get(x), self._index.get(y)
+            slot = None if xi is None or yi is None else self._neighbors[xi].get(yi)
+            cost = None if slot is None else self._cost_values[slot]
+            getattr(self, name)(*arguments)
+            if name == "remove_edge":
+                undo.append(("add_edge", (x, y, cost)))
+            elif slot is None:  # an added edge
+                undo.append(("remove_edge", (x, y)))
+            else:
+                undo.append(("change_cost", (x, y, cost)))
+
+    @staticmethod
+    def _accepted(edges, rejected):
+        """
+        Returns the edges of a call to add_edges_from / remove_edges_from that were not rejected
+        """
+        if not rejected:
+            return edges
+        failed = {id(edge) for edge, _ in rejected}
+        return [edge for edge in edges if id(edge) not in failed]
+
+    # COST STORAGE
+    def _store_edge(self, x, y, xi, yi, c):
+        """
+        Stores a new edge between x and y (with the ids xi and yi) and its cost in a free
+        slot (or a new one) and returns the slot
+        """
+        first, second = (xi, yi) if self._keyed_in_order(x, y, xi, yi) else (yi, xi)
+        values = self._cost_values
+        try:
+            if self._free_slots:
+                slot = self._free_slots[-1]
+                values[slot] = c
+                self._free_slots.pop()
+            else:
+                values.append(c)
+                slot = len(values) - 1
+                self._first.append(0)
+                self._second.append(0)
+                self._used.append(0)
+        except (TypeError, OverflowError):
+            raise ValueError("The cost must be a 64-bit integer!")
+        self._first[slot] = first
+        self._second[slot] = second
+        self._used[slot] = 1
+        return slot
+
+    def _free_slot(self, slot):
+        """
+        Marks the slot of a removed edge as free
+        """
+        self._used[slot] = 0
+        self._first[slot] = self._second[slot] = 0  # any id, so the labels of all the slots can be mapped
+        self._free_slots.append(slot)
+
+    def _set_cost(self, slot, c):
+        """
+        Changes the cost stored in a slot of _cost_values
+        """
+        try:
+            self._cost_values[slot] = c
+        except (TypeError, OverflowError):
+            raise ValueError("The cost must be a 64-bit integer!")
+
+
+# INSTRUMENTATION
+
+def _removed_vertex_entries(graph, vertex_to_delete):
+    """
+    Returns the number of entries Graph.remove_vertex walks through: the neighbors of the vertex
+    """
+    i = graph._index.get(vertex_to_delete)
+    return 0 if i is None else len(graph._neighbors[i])
+
+
+def _component_entries(graph, *args):
+    """
+    Returns the number of entries a component query walks through: every edge when the
+    components have to be built again, none when they are up to date
+    """
+    if graph._components is not None:
+        return 0
+    return len(graph._cost_values) - len(graph._free_slots)
+
+
+def _copied_entries(graph):
+    """
+    Returns the number of entries Graph.copy_graph walks through: the neighbors of every vertex
+    """
+    return sum(len(neighbors) for neighbors in graph._neighbors if neighbors is not None)
+
+
+# Methods that walk through the edges one by one, with a function returning the number of
+# entries a call looks at (from the same arguments). The lookups are not listed: edge_exists
+# is a dict lookup, get_neighbors goes through the neighbor index. remove_vertices is not
+# counted either: its vertices may come from an iterator that can only be read once.
+SCANNED_ENTRIES = {
+    "Graph.remove_vertex": _removed_vertex_entries,
+    "Graph.same_component": _component_entries,
+    "Graph.component_of": _component_entries,
+    "Graph.components": _component_entries,
+    "Graph.component_sizes": _component_entries,
+    "Graph.copy_graph": _copied_entries,
+}
+
+
+class GraphStats:
+    """
+    Opt-in instrumentation of graph classes: the calls and cumulative time of every public
+    method and property, and the entries the scanning methods look at
+
+    The methods are wrapped while the context is active and restored when it exits, so the
+    classes run at full speed when nobody measures them. Every call of a public method is
+    counted and timed from the call until it returns, including the public methods it calls
+    itself (add_vertex checking vertex_exists). The bulk methods such as add_edges_from work
+    on the storage directly, so they are one call and their time does not go through
+    add_edge; a batch shows up as the public methods it applies its changes with. A
+    generator method is only timed until it returns the generator. The scanned column adds
+    up the SCANNED_ENTRIES of the calls.
+
+        with GraphStats() as stats:
+            ui.connected_components_as_graphs(g)
+        print(stats.report())
+    """
+    def __init__(self, *classes):
+        """
+        :param classes: the classes to instrument (default: Graph)
+        """
+        self._classes = classes or (Graph,)
+        self._originals = []
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.scanned = Counter()
+
+    def __enter__(self):
+        for cls in self._classes:
+            for name, attribute in list(vars(cls).items()):
+                if name.startswith("_") and name not in ("__init__", "__str__"):
+                    continue
+                if isinstance(attribute, property) and attribute.fget is not None:
+                    wrapped = property(self._wrap(cls, name, attribute.fget), attribute.fset, attribute.fdel,
+                                       attribute.__doc__)
+                elif callable(attribute) and not isinstance(attribute, type):
+                    wrapped = self._wrap(cls, name, attribute)
+                else:
+                    continue
+                self._originals.append((cls, name, attribute))
+                setattr(cls, name, wrapped)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._originals:
+            cls, name, attribute = self._originals.pop()
+            setattr(cls, name, attribute)
+        return False
+
+    def _wrap(self, cls, name, function):
+        key = f"{cls.__name__}.{name}"
+        calls, seconds, scanned = self.calls, self.seconds, self.scanned
+        entries = SCANNED_ENTRIES.get(key)
+
+        @wraps(function)
+        def instrumented(graph, *args, **kwargs):
+            if entries is not None:
+                scanned[key] += entries(graph, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(graph, *args, **kwargs)
+            finally:
+                seconds[key] += perf_counter() - start
+                calls[key] += 1
+        return instrumented
+
+    def reset(self):
+        """
+        Sets all the counters back to zero
+        """
+        self.calls.clear()
+        self.seconds.clear()
+        self.scanned.clear()
+
+    def report(self):
+        """
+        Returns a table of the called methods, the slowest first
+        """
+        lines = [f"{'method':36} {'calls':>10} {'seconds':>12} {'us/call':>10} {'scanned':>12}"]
+        for key, total in self.seconds.most_common():
+            count = self.calls[key]
+            lines.append(f"{key:36} {count:10} {total:12.6f} {total / count * 1e6:10.2f} {self.scanned[key]:12}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(filename=None):
+    """
+    Runs a block under cProfile
+    :param filename: where to dump the pstats data (e.g. for snakeviz), or None
+    :return: the profiler, for pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if filename is not None:
+            profiler.dump_stats(filename)
@@ -1,4 +1,319 @@
-from collections import defaultdict, deque
+import cProfile
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from functools import wraps
+from itertools import chain, groupby, repeat
+from operator import itemgetter, sub
+from time import perf_counter
+
+
+class VertexIndex:
+    def __init__(self, labels=()):
+        """
+        Interns the vertices of a graph (any hashable labels) as dense integer ids 0, 1, 2, ...
+        The ids of removed vertices are reused, so they stay below the largest number
+        of vertices the graph ever had.
+        :param labels: the initial labels, they get the ids 0, 1, ... in order
+        """
+        self._ids = {}
+        self._labels = []
+        self._free_ids = []
+        for label in labels:
+            self.add(label)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, label):
+        return label in self._ids
+
+    @property
+    def capacity(self):
+        """
+        The number of ids handed out so far, free or in use
+        """
+        return len(self._labels)
+
+    def get(self, label, default=None):
+        """
+        Returns the id of a label, or default if the label is not interned
+        """
+        return self._ids.get(label, default)
+
+    def label_of(self, i):
+        """
+        Returns the label of an id
+        """
+        return self._labels[i]
+
+    @property
+    def label_lookup(self):
+        """
+        The function id -> label as a builtin (list.__getitem__), cheap to map over many ids
+        """
+        return self._labels.__getitem__
+
+    def labels_of(self, ids):
+        """
+        Returns the list of the labels of some ids
+        """
+        labels = self._labels
+        return [labels[i] for i in ids]
+
+    def labels(self):
+        """
+        Returns the labels, in the order they were added
+        """
+        return self._ids.keys()
+
+    def items(self):
+        """
+        Returns the (label, id) pairs, in the order the labels were added
+        """
+        return self._ids.items()
+
+    def add(self, label):
+        """
+        Interns a new label and returns its id
+        """
+        if self._free_ids:
+            i = self._free_ids.pop()
+            self._labels[i] = label
+        else:
+            i = len(self._labels)
+            self._labels.append(label)
+        self._ids[label] = i
+        return i
+
+    def remove(self, label):
+        """
+        Forgets a label and returns its id, which will be reused
+        """
+        i = self._ids.pop(label)
+        self._labels[i] = None
+        self._free_ids.append(i)
+        return i
+
+    def copy(self):
+        """
+        Returns an independent copy of the index
+        """
+        index = VertexIndex()
+        index._ids = dict(self._ids)
+        index._labels = list(self._labels)
+        index._free_ids = list(self._free_ids)
+        return index
+
+
+class _AdjacencyView(Mapping):
+    """
+    Read-only dict-like view vertex -> list of neighbours over the id based storage of a Graph
+    """
+
+    def __init__(self, index, neighbors):
+        self._index = index
+        self._neighbors = neighbors
+
+    def __getitem__(self, vertex):
+        i = self._index.get(vertex)
+        if i is None:
+            raise KeyError(vertex)
+        return self._index.labels_of(self._neighbors[i])
+
+    def __iter__(self):
+        return iter(self._index.labels())
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _CostsView(Mapping):
+    """
+    Read-only dict-like view (x, y) -> cost over the id based storage of a Graph
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        x, y = edge
+        graph = self._graph
+        xi, yi = graph._index.get(x), graph._index.get(y)
+        if xi is None or yi is None or yi not in graph._outgoing_edges[xi]:
+            raise KeyError(edge)
+        return graph._cost_values[graph._outgoing_edges[xi][yi]]
+
+    def __iter__(self):
+        label_of = self._graph._index.label_of
+        for x, xi in self._graph._index.items():
+            for yi in self._graph._outgoing_edges[xi]:
+                yield x, label_of(yi)
+
+    def __len__(self):
+        return self._graph.number_of_edges
+
+
+class NeighborView:
+    """
+    Read-only view of the neighbours of a vertex, returned by Graph.parse_outbound / parse_inbound
+
+    The view reads the graph's own storage instead of copying it, so the graph must not be
+    changed while a view is in use: using the view after the graph gained or lost a vertex or
+    an edge raises RuntimeError (a change in the middle of a loop over the view is caught by
+    the underlying dict when the neighbours of that vertex changed, and not at all otherwise).
+    Iterate over list(view) to change the graph in the loop.
+    """
+    __slots__ = ("_graph", "_neighbors", "_version")
+
+    def __init__(self, graph, neighbors):
+        self._graph = graph
+        self._neighbors = neighbors
+        self._version = graph._version
+
+    def _check(self):
+        """
+        Raises RuntimeError if the graph changed since the view was made
+        """
+        if self._graph._version != self._version:
+            raise RuntimeError("The graph changed while its neighbours were being parsed!")
+
+    def __iter__(self):
+        graph = self._graph
+        if graph._version != self._version:
+            self._check()
+        return map(graph._index.label_lookup, self._neighbors)
+
+    def __len__(self):
+        self._check()
+        return len(self._neighbors)
+
+    def __contains__(self, vertex):
+        self._check()
+        i = self._graph._index.get(vertex)
+        return i is not None and i in self._neighbors
+
+    def __repr__(self):
+        return f"NeighborView({list(self)})"
+
+
+class RawGraph:
+    """
+    Unchecked access to the storage of a Graph by vertex id, returned by Graph.raw
+
+    It is meant for algorithms that validate their input vertices once and then walk the
+    graph: nothing is checked (an unknown vertex or id raises KeyError / IndexError or gives
+    a wrong answer) and the adjacency dicts are the graph's own storage, to be read and never
+    changed. Take it after the last change of the graph: a change may replace the storage
+    it reads.
+    """
+    __slots__ = ("id_of", "label_of", "outbound", "inbound", "cost_of")
+
+    def __init__(self, graph):
+        self.id_of = graph._index._ids.__getitem__  # vertex -> id
+        self.label_of = graph._index.label_lookup  # id -> vertex
+        self.outbound = graph._outgoing_edges.__getitem__  # id -> {neighbour id: cost slot}
+        self.inbound = graph._incoming_edges.__getitem__  # id -> {neighbour id: cost slot}
+        self.cost_of = graph._cost_values.__getitem__  # cost slot -> cost
+
+    def edge_cost(self, xi, yi):
+        """
+        Returns the cost of the edge between the vertices with ids xi and yi
+        """
+        return self.cost_of(self.outbound(xi)[yi])
+
+
+class FrozenRawGraph:
+    """
+    Unchecked access to the arrays of a FrozenGraph by row, returned by FrozenGraph.raw
+
+    It has the functions of RawGraph, so an algorithm written against Graph.raw runs on a
+    frozen graph as well. The vertex ids are the rows; outbound and inbound build the dict of
+    a row from the CSR arrays when they are called, with the costs themselves as the cost
+    slots.
+    """
+    __slots__ = ("id_of", "label_of", "_graph")
+
+    def __init__(self, graph):
+        self.id_of = graph._index.__getitem__  # vertex -> row
+        self.label_of = graph._vertices.__getitem__  # row -> vertex
+        self._graph = graph
+
+    def outbound(self, i):
+        """
+        Returns {neighbour row: cost} for the outbound edges of the row i
+        """
+        g = self._graph
+        lo, hi = g._out_offsets[i], g._out_offsets[i + 1]
+        return dict(zip(g._out_targets[lo:hi], g._out_costs[lo:hi]))
+
+    def inbound(self, i):
+        """
+        Returns {neighbour row: cost} for the inbound edges of the row i
+        """
+        g = self._graph
+        lo, hi = g._in_offsets[i], g._in_offsets[i + 1]
+        return dict(zip(g._in_sources[lo:hi], g._in_costs[lo:hi]))
+
+    @staticmethod
+    def cost_of(slot):
+        """
+        Returns the cost of a cost slot, which is the cost itself here
+        """
+        return slot
+
+    def edge_cost(self, xi, yi):
+        """
+        Returns the cost of the edge between the rows xi and yi
+        """
+        return self.outbound(xi)[yi]
+
+
+class GraphBatch:
+    """
+    Changes of a graph collected by Graph.batch() and applied together when the with block ends
+
+    The changes are applied in order, the runs of add_edge and of remove_edge going through
+    add_edges_from / remove_edges_from, while an undo log keeps the inverse of every applied
+    change. If a change fails, the log is replayed backwards and its error is raised: the graph
+    has its vertices, edges and costs from before the batch again (a restored vertex or edge
+    may come later in the parsers than it used to). Nothing is applied if the with block raises.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._changes = []  # (name of the Graph method, arguments)
+        self._record = self._changes.append
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        changes, self._changes, self._record = self._changes, None, self._closed
+        if exc_type is None:
+            self._graph._apply_batch(changes)
+        return False
+
+    @staticmethod
+    def _closed(change):
+        raise RuntimeError("The batch was already applied!")
+
+    def add_vertex(self, new_vertex):
+        self._record(("add_vertex", (new_vertex,)))
+
+    def remove_vertex(self, vertex_to_delete):
+        self._record(("remove_vertex", (vertex_to_delete,)))
+
+    def add_edge(self, x, y, c):
+        self._record(("add_edge", (x, y, c)))
+
+    def remove_edge(self, x, y):
+        self._record(("remove_edge", (x, y)))
+
+    def change_cost(self, x, y, new_cost):
+        self._record(("change_cost", (x, y, new_cost)))
 
 
 class Graph:
@@ -11,21 +326,39 @@ class Graph:
         :param costs: the costs of the edges
         """
 
-        self._outgoing_edges = outgoing_edges if outgoing_edges is not None else {}
-        self._incoming_edges = incoming_edges if incoming_edges is not None else {}
-        self._costs = costs if costs is not None else {}
+        # the vertices are interned as dense ids and everything else is stored by id:
+        # _outgoing_edges[i] / _incoming_edges[i] map the neighbour ids of vertex i (insertion
+        # ordered, O(1) lookup and delete) to the slot of the edge cost in _cost_values;
+        # they are None for a free id
+        if incoming_edges or outgoing_edges or costs:
+            outgoing_edges = outgoing_edges or {}
+            incoming_edges = incoming_edges or {}
+            vertices = list(dict.fromkeys([*outgoing_edges, *incoming_edges]))
+        elif vertices is None:
+            vertices = []
+        elif isinstance(vertices, int):
+            vertices = range(vertices)
+
+        self._index = VertexIndex(vertices)
+        self._outgoing_edges = [{} for _ in range(self._index.capacity)]
+        self._incoming_edges = [{} for _ in range(self._index.capacity)]
+        self._cost_values = array('q')  # 64-bit costs, one slot per edge
+        self._free_slots = []  # slots of removed edges, reused first
+        self._isolated = {i for _, i in self._index.items()}  # ids of the vertices without any edge
 
-        if not (incoming_edges or outgoing_edges or costs):
-            if vertices is None:
-                vertices = []
+        self._version = 0  # changes whenever a vertex or an edge is added or removed, see NeighborView
 
-            if isinstance(vertices, int):
-                self._outgoing_edges = {i: [] for i in range(vertices)}
-                self._incoming_edges = {i: [] for i in range(vertices)}
-            elif isinstance(vertices, list):
-                self._outgoing_edges = {v: [] for v in vertices}
-                self._incoming_edges = {v: [] for v in vertices}
+        # copy-on-write state, see copy_graph: while _shared is False the graph owns all its storage
+        self._shared = False
+        self._owns_vertices = True
+        self._owns_costs = True
+        self._owns_isolated = True
+        self._owned_outgoing = set()
+        self._owned_incoming = set()
 
+        if outgoing_edges:
+            costs = costs or {}
+            self.add_edges_from((x, y, costs.get((x, y), 0)) for x in outgoing_edges for y in outgoing_edges[x])
 
     def __str__(self):
         """
@@ -48,82 +381,121 @@ class Graph:
     # GETTERS AND SETTERS
     @property
     def number_of_vertices(self):
-        return len(self._incoming_edges.keys())
+        return len(self._index)
+
+    @property
+    def number_of_edges(self):
+        return len(self._cost_values) - len(self._free_slots)
+
+    @property
+    def raw(self):
+        """
+        Unchecked access to the storage by vertex id, for algorithms (see RawGraph)
+        """
+        return RawGraph(self)
 
     @property
     def incoming_edges(self):
-        return self._incoming_edges
+        return _AdjacencyView(self._index, self._incoming_edges)
 
     @property
     def outgoing_edges(self):
-        return self._outgoing_edges
+        return _AdjacencyView(self._index, self._outgoing_edges)
 
     @property
     def costs(self):
-        return self._costs
+        return _CostsView(self)
 
     def set_costs(self, new):
-        self._costs = new
+        for (x, y), c in new.items():
+            self.change_cost(x, y, c)
 
     def get_edges(self):
         """
         Returns the edges of the graph
         """
-        return self._costs.keys()
+        return self.costs.keys()
+
+    def _vertex_id(self, vertex, message):
+        """
+        Returns the id of a vertex, raising ValueError(message) if it doesn't exist
+        """
+        i = self._index.get(vertex)
+        if i is None:
+            raise ValueError(message.format(vertex))
+        return i
 
     def get_cost_of_edge(self, x, y):
         """
         Returns the cost of an edge
         """
-        if not self.valid_vertex(x):
-            raise ValueError('The vertex {} not in graph!'.format(x))
-        if not self.valid_vertex(y):
-            raise ValueError('The vertex {} not in graph!'.format(y))
-        if not self.edge_exists(x, y):
+        xi = self._vertex_id(x, 'The vertex {} not in graph!')
+        yi = self._vertex_id(y, 'The vertex {} not in graph!')
+        if yi not in self._outgoing_edges[xi]:
             raise ValueError(f'Edge ({x}, {y}) not in graph!')
-        return self._costs[(x, y)]
+        return self._cost_values[self._outgoing_edges[xi][yi]]
 
     def change_cost(self, x, y, new_cost):
         """
         Changes the cost of the edge between x and y
         """
-        if not self.valid_vertex(x):
-            raise ValueError('The vertex {} not in graph!'.format(x))
-        if not self.valid_vertex(y):
-            raise ValueError('The vertex {} not in graph!'.format(y))
-        if not self.edge_exists(x, y):
+        xi = self._vertex_id(x, 'The vertex {} not in graph!')
+        yi = self._vertex_id(y, 'The vertex {} not in graph!')
+        if yi not in self._outgoing_edges[xi]:
             raise ValueError(f'Edge ({x}, {y}) not in graph!')
-        self._costs[(x, y)] = new_cost
+        slot = self._outgoing_edges[xi][yi]
+        try:
+            self._writable_costs()[slot] = new_cost
+        except (TypeError, OverflowError):
+            raise ValueError("The cost must be a 64-bit integer!")
 
     def valid_vertex(self, vertex):
         """
         Check if a vertex exists
         """
-        return vertex in self._incoming_edges.keys()
+        return vertex in self._index
 
     # PARSERS
     def parse_vertices(self):
         """
         Returns an iterator for the vertices
         """
-        return self._outgoing_edges.keys()
+        return self._index.labels()
 
     def parse_inbound(self, y):
         """
-        Returns an iterator for the inbound edges of a vertex
+        Returns an iterator for the inbound edges of a vertex (a NeighborView, nothing is copied)
         """
-        if not self.valid_vertex(y):
-            raise ValueError("The vertex {} doesn't exist!".format(y))
-        for x in self._incoming_edges[y]:
-            yield x
+        yi = self._vertex_id(y, "The vertex {} doesn't exist!")
+        return NeighborView(self, self._incoming_edges[yi])
 
     def parse_outbound(self, x):
         """
-        Returns an iterator for the outbound edges of a vertex
+        Returns an iterator for the outbound edges of a vertex (a NeighborView, nothing is copied)
+        """
+        xi = self._vertex_id(x, "The vertex {} doesn't exist!")
+        return NeighborView(self, self._outgoing_edges[xi])
+
+    def parse_edges(self):
         """
-        if not self.valid_vertex(x):
-            raise ValueError("The vertex {} doesn't exist!".format(x))
-        return list(self._outgoing_edges[x])
+        Returns an iterator for the edges (x, y, cost), grouped by x
+
+        The edges are read straight from the storage, so the graph must not change meanwhile.
+        """
+        label_of = self._index.label_lookup
+        cost_of = self._cost_values.__getitem__
+        for xi, neighbors in enumerate(self._outgoing_edges):
+            if neighbors:
+                yield from zip(repeat(label_of(xi)), map(label_of, neighbors), map(cost_of, neighbors.values()))
+
+    def isolated_vertices(self):
+        """
+        Returns the list of the vertices without inbound or outbound edges
+
+        The ids of these vertices are kept up to date by every change, so this takes
+        O(k log k) time for k isolated vertices instead of a pass over all of them.
+        """
+        return self._index.labels_of(sorted(self._isolated))
 
     # ADD & REMOVE VERTEX
     def add_vertex(self, new_vertex):
@@ -132,84 +504,734 @@ class Graph:
         """
         if self.valid_vertex(new_vertex):
             raise ValueError("The vertex {} already exists!".format(new_vertex))
-        self._outgoing_edges[new_vertex] = []
-        self._incoming_edges[new_vertex] = []
+        self._version += 1
+        self._own_vertices()
+        i = self._index.add(new_vertex)
+        if i == len(self._outgoing_edges):
+            self._outgoing_edges.append({})
+            self._incoming_edges.append({})
+        else:
+            self._outgoing_edges[i] = {}
+            self._incoming_edges[i] = {}
+        self._writable_isolated().add(i)
+        if self._shared:
+            self._owned_outgoing.add(i)
+            self._owned_incoming.add(i)
 
     def remove_vertex(self, vertex_to_delete):
         """
         Removes a vertex
         """
-        if not self.valid_vertex(vertex_to_delete):
-            raise ValueError("The vertex {} doesn't exist!".format(vertex_to_delete))
-        for e in list(self.parse_inbound(vertex_to_delete)):
-            self.remove_edge(e, vertex_to_delete)
-        for e in list(self.parse_outbound(vertex_to_delete)):
-            self.remove_edge(vertex_to_delete, e)
-        del self._incoming_edges[vertex_to_delete]
-        del self._outgoing_edges[vertex_to_delete]
+        vi = self._vertex_id(vertex_to_delete, "The vertex {} doesn't exist!")
+        for xi in list(self._incoming_edges[vi]):
+            self._remove_edge_ids(xi, vi)
+        for yi in list(self._outgoing_edges[vi]):
+            self._remove_edge_ids(vi, yi)
+        self._version += 1
+        self._own_vertices()
+        self._index.remove(vertex_to_delete)
+        self._writable_isolated().discard(vi)
+        self._incoming_edges[vi] = None
+        self._outgoing_edges[vi] = None
+        self._owned_outgoing.discard(vi)
+        self._owned_incoming.discard(vi)
 
     # ADD & REMOVE EDGE
     def add_edge(self, x, y, c):
         """
         Add an edge between vertices x and y
         """
-        if not self.valid_vertex(x):
-            raise ValueError("The vertex {} doesn't exist!".format(x))
-        if not self.valid_vertex(y):
-            raise ValueError("The vertex {} doesn't exist!".format(y))
-        if self.edge_exists(x, y):
+        xi = self._vertex_id(x, "The vertex {} doesn't exist!")
+        yi = self._vertex_id(y, "The vertex {} doesn't exist!")
+        if yi in self._outgoing_edges[xi]:
             raise ValueError("The edge already exists!")
-        self._outgoing_edges[x].append(y)
-        self._incoming_edges[y].append(x)
-        self._costs[(x, y)] = c
+        self._version += 1
+        slot = self._store_cost(c)
+        self._writable_outgoing(xi)[yi] = slot
+        self._writable_incoming(yi)[xi] = slot
+        if xi in self._isolated or yi in self._isolated:
+            isolated = self._writable_isolated()
+            isolated.discard(xi)
+            isolated.discard(yi)
         return True
 
     def remove_edge(self, x, y):
         """
         Remove an edge between vertices x and y
         """
-        if not self.valid_vertex(x):
-            raise ValueError("Vertex {} doesn't exist.".format(x))
-        if not self.valid_vertex(y):
-            raise ValueError("Vertex {} doesn't exist.".format(y))
-        if not self.edge_exists(x, y):
+        xi = self._vertex_id(x, "Vertex {} doesn't exist.")
+        yi = self._vertex_id(y, "Vertex {} doesn't exist.")
+        if yi not in self._outgoing_edges[xi]:
             raise ValueError("The edge doesn't exist!")
-        self._costs.pop((x, y))
-        self._outgoing_edges[x].remove(y)
-        self._incoming_edges[y].remove(x)
+        self._remove_edge_ids(xi, yi)
+
+    def _remove_edge_ids(self, xi, yi):
+        """
+        Removes the existing edge between the vertices with ids xi and yi
+        """
+        self._version += 1
+        self._writable_costs()
+        outbound = self._writable_outgoing(xi)
+        inbound = self._writable_incoming(yi)
+        self._free_slots.append(outbound.pop(yi))
+        del inbound[xi]
+        if not outbound and not self._incoming_edges[xi]:
+            self._writable_isolated().add(xi)
+        if not inbound and not self._outgoing_edges[yi]:
+            self._writable_isolated().add(yi)
+
+    def _store_cost(self, c):
+        """
+        Stores the cost of a new edge in a free slot of _cost_values and returns the slot
+        """
+        values = self._writable_costs()
+        try:
+            if self._free_slots:
+                slot = self._free_slots[-1]
+                values[slot] = c
+                return self._free_slots.pop()
+            values.append(c)
+        except (TypeError, OverflowError):
+            raise ValueError("The cost must be a 64-bit integer!")
+        return len(values) - 1
+
+    def add_edges_from(self, edges):
+        """
+        Adds many edges at once
+
+        The endpoints of the whole batch are resolved first and the edges are added in
+        one pass. Invalid edges do not raise: they are skipped and reported.
+        :param edges: an iterable of (x, y, cost) triples
+        :return: the number of added edges and a list of ((x, y, cost), message) for the rejected ones
+        """
+        edges = list(edges)
+        get = self._index._ids.get  # the dict's own get, without a Python call per endpoint
+        resolved = [(get(x), get(y)) for x, y, _ in edges]
+        if self._shared:
+            self._own_adjacency({xi for xi, _ in resolved if xi is not None},
+                                {yi for _, yi in resolved if yi is not None})
+        self._version += 1
+        outgoing, incoming = self._outgoing_edges, self._incoming_edges
+        values = self._writable_costs()
+        free_slots = self._free_slots
+        isolated = self._writable_isolated() if self._isolated else None
+
+        added = 0
+        rejected = []
+        for edge, (xi, yi) in zip(edges, resolved):
+            if xi is None or yi is None:
+                v = edge[0] if xi is None else edge[1]
+                rejected.append((edge, "The vertex {} doesn't exist!".format(v)))
+            elif yi in outgoing[xi]:
+                rejected.append((edge, "The edge already exists!"))
+            else:
+                try:  # _store_cost, inlined
+                    if free_slots:
+                        slot = free_slots[-1]
+                        values[slot] = edge[2]
+                        free_slots.pop()
+                    else:
+                        slot = len(values)
+                        values.append(edge[2])
+                except (TypeError, OverflowError):
+                    rejected.append((edge, "The cost must be a 64-bit integer!"))
+                    continue
+                outgoing[xi][yi] = slot
+                incoming[yi][xi] = slot
+                added += 1
+                if isolated:
+                    isolated.discard(xi)
+                    isolated.discard(yi)
+        return added, rejected
+
+    def remove_edges_from(self, edges):
+        """
+        Removes many edges at once, skipping and reporting the ones that can't be removed
+        :param edges: an iterable of (x, y) pairs
+        :return: the number of removed edges and a list of ((x, y), message) for the rejected ones
+        """
+        edges = list(edges)
+        get = self._index._ids.get  # the dict's own get, without a Python call per endpoint
+        resolved = [(get(x), get(y)) for x, y in edges]
+        if self._shared:
+            self._own_adjacency({xi for xi, _ in resolved if xi is not None},
+                                {yi for _, yi in resolved if yi is not None})
+        self._version += 1
+        self._writable_costs()
+        outgoing, incoming, free_slots = self._outgoing_edges, self._incoming_edges, self._free_slots
+        emptied = []  # ids that may have lost their last edge
+
+        removed = 0
+        rejected = []
+        for edge, (xi, yi) in zip(edges, resolved):
+            if xi is None or yi is None:
+                v = edge[0] if xi is None else edge[1]
+                rejected.append((edge, "Vertex {} doesn't exist.".format(v)))
+            elif yi not in outgoing[xi]:
+                rejected.append((edge, "The edge doesn't exist!"))
+            else:
+                free_slots.append(outgoing[xi].pop(yi))
+                del incoming[yi][xi]
+                removed += 1
+                if not outgoing[xi]:
+                    emptied.append(xi)
+                if not incoming[yi]:
+                    emptied.append(yi)
+        emptied = [i for i in emptied if not outgoing[i] and not incoming[i]]
+        if emptied:
+            self._writable_isolated().update(emptied)
+        return removed, rejected
 
     # # DEGREE
     def incoming_degree(self, vertex):
         """
         Returns the in degree of a vertex
         """
-        if not self.valid_vertex(vertex):
-            raise ValueError("The vertex {} doesn't exist!".format(vertex))
-        return len(self._incoming_edges[vertex])
+        i = self._vertex_id(vertex, "The vertex {} doesn't exist!")
+        return len(self._incoming_edges[i])
 
     def outgoing_degree(self, vertex):
         """
         Return the out degree of a vertex
         """
-        if not self.valid_vertex(vertex):
-            raise ValueError("The vertex {} doesn't exist!".format(vertex))
-        return len(self._outgoing_edges[vertex])
+        i = self._vertex_id(vertex, "The vertex {} doesn't exist!")
+        return len(self._outgoing_edges[i])
+
+    def degrees(self):
+        """
+        Returns the in degrees and the out degrees of all the vertices, as two arrays in the
+        order of parse_vertices()
+        """
+        ids = [i for _, i in self._index.items()]
+        return (array('q', map(len, map(self._incoming_edges.__getitem__, ids))),
+                array('q', map(len, map(self._outgoing_edges.__getitem__, ids))))
 
     def edge_exists(self, x, y):
         """
         Check if there is an edge between two vertices
         """
-        if not self.valid_vertex(x):
-            raise ValueError("The vertex {} doesn't exist!".format(x))
-        if not self.valid_vertex(y):
-            raise ValueError("The vertex {} doesn't exist!".format(y))
-        return y in self._outgoing_edges[x]
+        xi = self._vertex_id(x, "The vertex {} doesn't exist!")
+        yi = self._vertex_id(y, "The vertex {} doesn't exist!")
+        return yi in self._outgoing_edges[xi]
 
     def copy_graph(self):
         """
-        Returns a copy of the graph
+        Returns a copy of the graph in O(1) time
+
+        The copy and the graph share their storage (copy-on-write): when one of them changes
+        the neighbours of a vertex, it first copies the dicts of that vertex, so changes
+        never show up in the other graph.
+        """
+        copy = Graph()
+        copy._index = self._index
+        copy._outgoing_edges = self._outgoing_edges
+        copy._incoming_edges = self._incoming_edges
+        copy._cost_values = self._cost_values
+        copy._free_slots = self._free_slots
+        copy._isolated = self._isolated
+        self._start_sharing()
+        copy._start_sharing()
+        return copy
+
+    # BATCHES
+    def batch(self):
+        """
+        Returns a GraphBatch, to make many changes at once and atomically:
+            with graph.batch() as b:
+                b.add_edge(x, y, c)
+                b.remove_edge(u, v)
+        """
+        return GraphBatch(self)
+
+    def _apply_batch(self, changes):
+        """
+        Applies the changes of a GraphBatch, all of them or (if one fails) none
+        """
+        undo = []  # (name of the Graph method, arguments) undoing the changes applied so far
+        try:
+            for name, group in groupby(changes, key=itemgetter(0)):
+                arguments = list(map(itemgetter(1), group))
+                if len(arguments) == 1 or name not in ("add_edge", "remove_edge"):
+                    for a in arguments:
+                        self._apply_change(name, a, undo)
+                    continue
+                if name == "add_edge":
+                    _, rejected = self.add_edges_from(arguments)
+                    added = ((x, y) for x, y, _ in self._accepted(arguments, rejected))
+                    undo.append(("remove_edges_from", (added,)))
+                else:
+                    removed, rejected = self.remove_edges_from(arguments)
+                    # the slots of the removed edges were freed in order and still hold their costs
+                    free_slots = self._free_slots
+                    costs = array('q', map(self._cost_values.__getitem__, free_slots[len(free_slots) - removed:]))
+                    restored = ((x, y, c) for (x, y), c in zip(self._accepted(arguments, rejected), costs))
+                    undo.append(("add_edges_from", (restored,)))
+                if rejected:
+                    raise ValueError(rejected[0][1])
+        except Exception:
+            for name, arguments in reversed(undo):
+                getattr(self, name)(*arguments)
+            raise
+
+    def _apply_change(self, name, arguments, undo):
+        """
+        Makes one change of a GraphBatch and appends the changes undoing it to the undo log of _apply_batch
+        """
+        if name == "add_edge":
+            self.add_edge(*arguments)
+            undo.append(("remove_edge", arguments[:2]))
+        elif name == "remove_edge" or name == "change_cost":
+            x, y = arguments[0], arguments[1]
+            cost = self._existing_cost(x, y)
+            getattr(self, name)(*arguments)
+            undo.append(("add_edge", (x, y, cost)) if name == "remove_edge" else ("change_cost", (x, y, cost)))
+        elif name == "add_vertex":
+            self.add_vertex(*arguments)
+            undo.append(("remove_vertex", arguments))
+        else:
+            v = arguments[0]
+            vi = self._vertex_id(v, "The vertex {} doesn't exist!")
+            label_of, values = self._index.label_lookup, self._cost_values
+            edges = [(v, label_of(yi), values[slot]) for yi, slot in self._outgoing_edges[vi].items()]
+            edges.extend((label_of(xi), v, values[slot]) for xi, slot in self._incoming_edges[vi].items() if xi != vi)
+            self.remove_vertex(v)
+            undo.append(("add_edges_from", (edges,)))  # replayed backwards: after the vertex is back
+            undo.append(("add_vertex", (v,)))
+
+    @staticmethod
+    def _accepted(edges, rejected):
+        """
+        Returns the edges of a call to add_edges_from / remove_edges_from that were not rejected
         """
-        incoming_edges_copy = self._incoming_edges.copy()
-        outgoing_edges_copy = self._outgoing_edges.copy()
-        costs_copy = self._costs.copy()
-        return Graph(None, incoming_edges_copy, outgoing_edges_copy, costs_copy)
+        if not rejected:
+            return edges
+        failed = {id(edge) for edge, _ in rejected}
+        return [edge for edge in edges if id(edge) not in failed]
+
+    def _existing_cost(self, x, y):
+        """
+        Returns the cost of the edge (x, y), or None if it doesn't exist
+        """
+        get = self._index._ids.get
+        xi, yi = get(x), get(y)
+        if xi is None or yi is None:
+            return None
+        slot = self._outgoing_edges[xi].get(yi)
+        return None if slot is None else self._cost_values[slot]
+
+    # COPY-ON-WRITE
+    def _start_sharing(self):
+        """
+        Marks all the storage of the graph as shared with a copy
+        """
+        self._shared = True
+        self._owns_vertices = False
+        self._owns_costs = False
+        self._owns_isolated = False
+        self._owned_outgoing = set()
+        self._owned_incoming = set()
+
+    def _own_vertices(self):
+        """
+        Copies the storage indexed by vertex if it is shared, before adding or removing a vertex
+        """
+        if not self._owns_vertices:
+            self._index = self._index.copy()
+            self._outgoing_edges = list(self._outgoing_edges)
+            self._incoming_edges = list(self._incoming_edges)
+            self._owns_vertices = True
+
+    def _writable_costs(self):
+        """
+        Returns the cost array, copying it (and the free slots) first if it is shared
+        """
+        if not self._owns_costs:
+            self._cost_values = array('q', self._cost_values)
+            self._free_slots = list(self._free_slots)
+            self._owns_costs = True
+        return self._cost_values
+
+    def _writable_isolated(self):
+        """
+        Returns the set of the isolated vertex ids, copying it first if it is shared
+        """
+        if not self._owns_isolated:
+            self._isolated = set(self._isolated)
+            self._owns_isolated = True
+        return self._isolated
+
+    def _writable_outgoing(self, xi):
+        """
+        Returns the outbound neighbours of the vertex with id xi, copying them first if they are shared
+        """
+        if self._shared and xi not in self._owned_outgoing:
+            self._own_vertices()
+            self._outgoing_edges[xi] = dict(self._outgoing_edges[xi])
+            self._owned_outgoing.add(xi)
+        return self._outgoing_edges[xi]
+
+    def _writable_incoming(self, yi):
+        """
+        Returns the inbound neighbours of the vertex with id yi, copying them first if they are shared
+        """
+        if self._shared and yi not in self._owned_incoming:
+            self._own_vertices()
+            self._incoming_edges[yi] = dict(self._incoming_edges[yi])
+            self._owned_incoming.add(yi)
+        return self._incoming_edges[yi]
+
+    def _own_adjacency(self, sources, targets):
+        """
+        Makes the outbound neighbours of the source ids and the inbound neighbours of the target ids writable
+        """
+        for xi in sources:
+            self._writable_outgoing(xi)
+        for yi in targets:
+            self._writable_incoming(yi)
+
+    def freeze(self):
+        """
+        Returns an immutable compressed sparse row (CSR) snapshot of the graph
+
+        The outbound edges of the i-th vertex are out_targets[out_offsets[i]:out_offsets[i + 1]],
+        stored as vertex indices sorted ascending, with their costs at the same positions in
+        out_costs. The inbound edges are stored the same way in a transposed copy.
+        """
+        vertices = list(self._index.labels())
+        ids = [i for _, i in self._index.items()]
+        row_of = {i: r for r, i in enumerate(ids)}
+
+        values = self._cost_values
+
+        out_offsets, out_targets, out_costs = array('q', [0]), array('q'), array('q')
+        for xi in ids:
+            neighbors = self._outgoing_edges[xi]
+            row = sorted(row_of[yi] for yi in neighbors)
+            out_targets.extend(row)
+            out_costs.extend(values[neighbors[ids[r]]] for r in row)
+            out_offsets.append(len(out_targets))
+
+        in_offsets, in_sources, in_costs = array('q', [0]), array('q'), array('q')
+        for yi in ids:
+            neighbors = self._incoming_edges[yi]
+            row = sorted(row_of[xi] for xi in neighbors)
+            in_sources.extend(row)
+            in_costs.extend(values[neighbors[ids[r]]] for r in row)
+            in_offsets.append(len(in_sources))
+
+        return FrozenGraph(vertices, out_offsets, out_targets, out_costs, in_offsets, in_sources, in_costs)
+
+
+class FrozenGraph:
+    def __init__(self, vertices, out_offsets, out_targets, out_costs, in_offsets, in_sources, in_costs):
+        """
+        Read-only directed graph in compressed sparse row form, see Graph.freeze
+        :param vertices: the vertices, in the order of the rows
+        :param out_offsets: n + 1 offsets of the rows of outbound edges
+        :param out_targets: the indices of the target vertices, sorted inside each row
+        :param out_costs: the costs of the outbound edges
+        :param in_offsets: n + 1 offsets of the rows of inbound edges
+        :param in_sources: the indices of the source vertices, sorted inside each row
+        :param in_costs: the costs of the inbound edges
+        """
+        self._vertices = tuple(vertices)
+        self._index = {v: i for i, v in enumerate(self._vertices)}
+        self._out_offsets = memoryview(out_offsets).toreadonly()
+        self._out_targets = memoryview(out_targets).toreadonly()
+        self._out_costs = memoryview(out_costs).toreadonly()
+        self._in_offsets = memoryview(in_offsets).toreadonly()
+        self._in_sources = memoryview(in_sources).toreadonly()
+        self._in_costs = memoryview(in_costs).toreadonly()
+
+    def __str__(self):
+        """
+        Returns the string representation of the graph
+        """
+        graph = []
+
+        graph.append("Outbound:")
+        for x in self.parse_vertices():
+            outbound_edges = " ".join(map(str, self.parse_outbound(x)))
+            graph.append(f"{x}: {outbound_edges}")
+
+        graph.append("Inbound:")
+        for x in self.parse_vertices():
+            inbound_edges = " ".join(map(str, self.parse_inbound(x)))
+            graph.append(f"{x}: {inbound_edges}")
+
+        return "\n".join(graph)
+
+    @property
+    def number_of_vertices(self):
+        return len(self._vertices)
+
+    @property
+    def number_of_edges(self):
+        return len(self._out_targets)
+
+    @property
+    def raw(self):
+        """
+        Unchecked access to the arrays by row, for algorithms (see FrozenRawGraph)
+        """
+        return FrozenRawGraph(self)
+
+    def csr_arrays(self):
+        """
+        Returns the arrays of the graph: out_offsets, out_targets, out_costs, in_offsets, in_sources, in_costs
+        """
+        return (self._out_offsets, self._out_targets, self._out_costs,
+                self._in_offsets, self._in_sources, self._in_costs)
+
+    def valid_vertex(self, vertex):
+        """
+        Check if a vertex exists
+        """
+        return vertex in self._index
+
+    def _row(self, vertex):
+        """
+        Returns the index of an existing vertex
+        """
+        if vertex not in self._index:
+            raise ValueError("The vertex {} doesn't exist!".format(vertex))
+        return self._index[vertex]
+
+    def _find_edge(self, x, y):
+        """
+        Returns the position of the edge (x, y) in the outbound arrays, or -1
+        """
+        i, j = self._row(x), self._row(y)
+        lo, hi = self._out_offsets[i], self._out_offsets[i + 1]
+        position = bisect_left(self._out_targets, j, lo, hi)
+        if position < hi and self._out_targets[position] == j:
+            return position
+        return -1
+
+    # PARSERS
+    def parse_vertices(self):
+        """
+        Returns an iterator for the vertices
+        """
+        return iter(self._vertices)
+
+    def parse_inbound(self, y):
+        """
+        Returns an iterator for the inbound edges of a vertex
+        """
+        i = self._row(y)
+        vertices = self._vertices
+        return (vertices[x] for x in self._in_sources[self._in_offsets[i]:self._in_offsets[i + 1]])
+
+    def parse_outbound(self, x):
+        """
+        Returns an iterator for the outbound edges of a vertex
+        """
+        i = self._row(x)
+        vertices = self._vertices
+        return (vertices[y] for y in self._out_targets[self._out_offsets[i]:self._out_offsets[i + 1]])
+
+    def parse_edges(self):
+        """
+        Returns an iterator for the edges (x, y, cost), grouped by x
+        """
+        vertices = self._vertices
+        offsets = self._out_offsets
+        sources = chain.from_iterable(map(repeat, vertices, map(sub, offsets[1:], offsets[:-1])))
+        return zip(sources, map(vertices.__getitem__, self._out_targets), self._out_costs)
+
+    def isolated_vertices(self):
+        """
+        Returns the list of the vertices without inbound or outbound edges
+        """
+        out_offsets, in_offsets = self._out_offsets, self._in_offsets
+        return [v for i, v in enumerate(self._vertices)
+                if out_offsets[i] == out_offsets[i + 1] and in_offsets[i] == in_offsets[i + 1]]
+
+    def get_cost_of_edge(self, x, y):
+        """
+        Returns the cost of an edge
+        """
+        position = self._find_edge(x, y)
+        if position == -1:
+            raise ValueError(f'Edge ({x}, {y}) not in graph!')
+        return self._out_costs[position]
+
+    def edge_exists(self, x, y):
+        """
+        Check if there is an edge between two vertices
+        """
+        return self._find_edge(x, y) != -1
+
+    # DEGREE
+    def incoming_degree(self, vertex):
+        """
+        Returns the in degree of a vertex
+        """
+        i = self._row(vertex)
+        return self._in_offsets[i + 1] - self._in_offsets[i]
+
+    def outgoing_degree(self, vertex):
+        """
+        Return the out degree of a vertex
+        """
+        i = self._row(vertex)
+        return self._out_offsets[i + 1] - self._out_offsets[i]
+
+    def degrees(self):
+        """
+        Returns the in degrees and the out degrees of all the vertices, as two arrays in the
+        order of parse_vertices()
+        """
+        in_offsets, out_offsets = self._in_offsets, self._out_offsets
+        return (array('q', map(sub, in_offsets[1:], in_offsets[:-1])),
+                array('q', map(sub, out_offsets[1:], out_offsets[:-1])))
+
+    def thaw(self):
+        """
+        Returns a mutable Graph with the same vertices, edges and costs
+        """
+        g = Graph(list(self._vertices))
+        vertices = self._vertices
+        g.add_edges_from((x, vertices[self._out_targets[position]], self._out_costs[position])
+                         for i, x in enumerate(vertices)
+                         for position in range(self._out_offsets[i], self._out_offsets[i + 1]))
+        return g
+
+
+# INSTRUMENTATION
+
+def _removed_vertex_entries(graph, vertex):
+    """
+    Returns the number of entries Graph.remove_vertex walks through: the edges of the vertex
+    """
+    vi = graph._index.get(vertex)
+    if vi is None:
+        return 0
+    return len(graph._incoming_edges[vi]) + len(graph._outgoing_edges[vi])
+
+
+def _frozen_entries(graph):
+    """
+    Returns the number of entries Graph.freeze walks through: the outbound and inbound rows of every vertex
+    """
+    return 2 * (len(graph._cost_values) - len(graph._free_slots))
+
+
+def _thawed_entries(graph):
+    """
+    Returns the number of entries FrozenGraph.thaw walks through: the outbound rows of every vertex
+    """
+    return len(graph._out_targets)
+
+
+# Methods that walk through adjacency entries one by one, with a function returning the number
+# of entries a call looks at (from the same arguments). The lookups are not listed: edge_exists
+# is a dict lookup (a bisection in FrozenGraph).
+SCANNED_ENTRIES = {
+    "Graph.remove_vertex": _removed_vertex_entries,
+    "Graph.freeze": _frozen_entries,
+    "FrozenGraph.thaw": _thawed_entries,
+}
+
+
+class GraphStats:
+    """
+    Opt-in instrumentation of graph classes: the calls and cumulative time of every public
+    method and property, and the adjacency entries the scanning methods look at
+
+    The methods are wrapped while the context is active and restored when it exits, so the
+    classes run at full speed when nobody measures them. Every call of a public method is
+    counted and timed from the call until it returns. The bulk methods such as
+    add_edges_from work on the storage directly, so they are one call and their time does
+    not go through add_edge; a batch shows up as the public methods it applies its changes
+    with. A generator method is only timed until it returns the generator. The scanned
+    column adds up the SCANNED_ENTRIES of the calls.
+
+        with GraphStats() as stats:
+            ui.backwards_dijkstra(g, 0, 10)
+        print(stats.report())
+    """
+    def __init__(self, *classes):
+        """
+        :param classes: the classes to instrument (default: Graph and FrozenGraph)
+        """
+        self._classes = classes or (Graph, FrozenGraph)
+        self._originals = []
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.scanned = Counter()
+
+    def __enter__(self):
+        for cls in self._classes:
+            for name, attribute in list(vars(cls).items()):
+                if name.startswith("_") and name not in ("__init__", "__str__"):
+                    continue
+                if isinstance(attribute, property) and attribute.fget is not None:
+                    wrapped = property(self._wrap(cls, name, attribute.fget), attribute.fset, attribute.fdel,
+                                       attribute.__doc__)
+                elif callable(attribute) and not isinstance(attribute, type):
+                    wrapped = self._wrap(cls, name, attribute)
+                else:
+                    continue
+                self._originals.append((cls, name, attribute))
+                setattr(cls, name, wrapped)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._originals:
+            cls, name, attribute = self._originals.pop()
+            setattr(cls, name, attribute)
+        return False
+
+    def _wrap(self, cls, name, function):
+        key = f"{cls.__name__}.{name}"
+        calls, seconds, scanned = self.calls, self.seconds, self.scanned
+        entries = SCANNED_ENTRIES.get(key)
+
+        @wraps(function)
+        def instrumented(graph, *args, **kwargs):
+            if entries is not None:
+                scanned[key] += entries(graph, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(graph, *args, **kwargs)
+            finally:
+                seconds[key] += perf_counter() - start
+                calls[key] += 1
+        return instrumented
+
+    def reset(self):
+        """
+        Sets all the counters back to zero
+        """
+        self.calls.clear()
+        self.seconds.clear()
+        self.scanned.clear()
+
+    def report(self):
+        """
+        Returns a table of the called methods, the slowest first
+        """
+        lines = [f"{'method':36} {'calls':>10} {'seconds':>12} {'us/call':>10} {'scanned':>12}"]
+        for key, total in self.seconds.most_common():
+            count = self.calls[key]
+            lines.append(f"{key:36} {count:10} {total:12.6f} {total / count * 1e6:10.2f} {self.scanned[key]:12}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(filename=None):
+    """
+    Runs a block under cProfile
+    :param filename: where to dump the pstats data (e.g. for snakeviz), or None
+    :return: the profiler, for pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if filename is not None:
+            profiler.dump_stats(filename)
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the graph assignments.
+
+Every assignment folder is a standalone program (it imports `graph` from its own
+directory), so the benchmarks load the modules by path instead of importing them.
+"""
@@ -0,0 +1,91 @@
+import ast
+import importlib
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def assignment_path(assignment, filename):
+    """
+    Returns the path of a file from an assignment folder
+    :param assignment: the number of the assignment (1..5)
+    :param filename: the name of the file inside the folder
+    """
+    return os.path.join(ROOT, f"assignment-{assignment}", filename)
+
+
+def load_module(path, name=None, definitions_only=False):
+    """
+    Loads a python source file as a fresh module
+    :param path: the path of the file
+    :param name: the name to give to the module (defaults to a name derived from the path)
+    :param definitions_only: skip the bare calls at the top level of the file, e.g. the
+                             unguarded UI().main() at the end of an older main.py
+    :return: the loaded module
+    """
+    if name is None:
+        name = "bench_" + os.path.splitext(os.path.relpath(path, ROOT))[0].replace(os.sep, "_").replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    if not definitions_only:
+        spec.loader.exec_module(module)
+        return module
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    tree.body = [node for node in tree.body if not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call))]
+    exec(compile(tree, path, "exec"), module.__dict__)
+    return module
+
+
+def load_graph_class(assignment=1, path=None):
+    """
+    Returns the Graph class of an assignment, or of an explicit graph.py file
+    """
+    if path is None:
+        path = assignment_path(assignment, "graph.py")
+    return load_module(path).Graph
+
+
+def load_main_module(assignment=1, path=None):
+    """
+    Imports the main.py of an assignment (or an explicit main.py, next to its graph.py) as
+    the module "main", with its folder on sys.path
+
+    Unlike load_module the module is importable by name, so worker processes (e.g. of
+    read_graph_from_file_parallel) can unpickle its functions. Only one assignment can be
+    loaded this way per process.
+    """
+    if path is None:
+        path = assignment_path(assignment, "main.py")
+    folder = os.path.dirname(os.path.abspath(path))
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    for name in ("main", "graph"):
+        sys.modules.pop(name, None)
+    return importlib.import_module("main")
+
+
+def load_assignment(assignment, path=None, definitions_only=False):
+    """
+    Loads the main.py of an assignment (or an explicit main.py) as a fresh module, together
+    with the graph.py next to it
+
+    Every main.py imports "graph" from its own folder, so the folder goes first on sys.path
+    and the cached "graph" module is dropped while the file runs. Unlike load_main_module,
+    the modules of several assignments can be used side by side this way.
+    :param definitions_only: see load_module, for a main.py that starts its menu when imported
+    """
+    if path is None:
+        path = assignment_path(assignment, "main.py")
+    folder = os.path.dirname(os.path.abspath(path))
+    saved = sys.modules.pop("graph", None)
+    sys.path.insert(0, folder)
+    try:
+        return load_module(path, definitions_only=definitions_only)
+    finally:
+        sys.path.remove(folder)
+        sys.modules.pop("graph", None)
+        if saved is not None:
+            sys.modules["graph"] = saved
@@ -0,0 +1,48 @@
+"""
+Times the backwards Dijkstra search of assignment 3 (UI.backwards_dijkstra) on a generated graph.
+
+The graph has power-law out degrees, and the searches go between seeded random pairs of
+vertices, so two runs (e.g. of two checkouts) search the same paths.
+
+    python -m benchmarks.dijkstra --vertices 100000 --edges 1000000 --searches 20
+    python -m benchmarks.dijkstra --main /path/to/old/assignment-3/main.py
+
+An older main.py is loaded without running its menu, and an older Graph without
+add_edges_from gets the edges one by one (slowly, with list based adjacency: use
+smaller sizes there).
+"""
+import argparse
+import time
+from random import Random
+
+from benchmarks.assignments import load_assignment
+from benchmarks.generators import build_graph, power_law_edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=100000)
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--main", help="explicit main.py to measure, next to its graph.py (e.g. from an older checkout)")
+    args = parser.parse_args()
+
+    module = load_assignment(3, args.main, definitions_only=True)
+    g = build_graph(module.Graph, args.vertices, power_law_edges(args.vertices, args.edges, args.seed))
+    rng = Random(args.seed)
+    pairs = [(rng.randrange(args.vertices), rng.randrange(args.vertices)) for _ in range(args.searches)]
+
+    ui = module.UI()
+    total = 0
+    start = time.perf_counter()
+    for x, y in pairs:
+        cost, _ = ui.backwards_dijkstra(g, x, y)
+        total += cost or 0
+    seconds = time.perf_counter() - start
+    print(f"{args.searches} searches on {args.edges} edges: {seconds:.3f} s "
+          f"({seconds / args.searches * 1000:.1f} ms per search, total cost {total})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Seeded generators of benchmark graphs.
+
+Every generator returns a list of (x, y, cost) edges over the vertices 0, 1, ..., n - 1,
+and the same seed always gives the same edges. build_graph turns them into a Graph of
+any assignment, write_graph_file writes them in the "n m" text format the assignments
+read, and write_project_file writes a DAG as an assignment-4 project file.
+
+    python -m benchmarks.generators gnp 10000 --p 0.001 --seed 1 -o gnp.txt
+    python -m benchmarks.generators dag 26 --p 0.2 --project -o project.txt
+"""
+import argparse
+import math
+from random import Random
+
+DEFAULT_COSTS = (0, 100)  # the costs create_random_graph uses
+
+
+def _costs(rng, count, costs):
+    """
+    Draws count costs uniformly from the inclusive range costs = (low, high)
+    """
+    low, high = costs
+    return rng.choices(range(low, high + 1), k=count)
+
+
+def _pair_of_index(k):
+    """
+    Returns the k-th pair (x, y) with x < y, the pairs being ordered by y and then by x
+    """
+    y = (1 + math.isqrt(1 + 8 * k)) // 2
+    return k - y * (y - 1) // 2, y
+
+
+def _geometric_indices(rng, space, p):
+    """
+    Returns the sorted indices of range(space) kept independently with probability p
+
+    Instead of a coin flip per index, the gap to the next kept index is drawn from a
+    geometric distribution, so the work is proportional to the number of kept indices.
+    """
+    if p <= 0:
+        return []
+    if p >= 1:
+        return list(range(space))
+    log_q = math.log(1 - p)
+    indices = []
+    k = -1
+    while True:
+        k += 1 + int(math.log(1 - rng.random()) / log_q)
+        if k >= space:
+            return indices
+        indices.append(k)
+
+
+def gnp_edges(n, p, seed=0, directed=True, costs=DEFAULT_COSTS):
+    """
+    Erdos-Renyi G(n, p): every possible edge (without loops) is present with probability p
+    :param n: the number of vertices
+    :param p: the probability of each edge
+    :param seed: the seed of the random generator
+    :param directed: whether (x, y) and (y, x) are different edges
+    :param costs: the inclusive range of the costs
+    """
+    rng = Random(seed)
+    if directed:
+        indices = _geometric_indices(rng, n * (n - 1), p)
+        pairs = []
+        for k in indices:
+            x, r = divmod(k, n - 1)
+            pairs.append((x, r + (r >= x)))  # skip the loop (x, x)
+    else:
+        pairs = [_pair_of_index(k) for k in _geometric_indices(rng, n * (n - 1) // 2, p)]
+    return [(x, y, c) for (x, y), c in zip(pairs, _costs(rng, len(pairs), costs))]
+
+
+def power_law_edges(n, m, seed=0, attachment=0.9, costs=DEFAULT_COSTS):
+    """
+    Distinct directed edges whose source vertices follow a power law (preferential attachment)
+    :param n: the number of vertices
+    :param m: the number of edges
+    :param seed: the seed of the random generator
+    :param attachment: the probability of picking the source proportionally to its out degree
+    :param costs: the inclusive range of the costs
+    """
+    if m > n * n:
+        raise ValueError("Too many edges!")
+    rng = Random(seed)
+    sources = []  # a vertex appears here once for every edge leaving it
+    seen = set()
+    pairs = []
+    while len(pairs) < m:
+        if sources and rng.random() < attachment:
+            x = rng.choice(sources)  # the more edges a vertex has, the likelier it gets another one
+        else:
+            x = rng.randrange(n)
+        y = rng.randrange(n)
+        if (x, y) in seen:
+            continue
+        seen.add((x, y))
+        sources.append(x)
+        pairs.append((x, y))
+    return [(x, y, c) for (x, y), c in zip(pairs, _costs(rng, m, costs))]
+
+
+def grid_edges(rows, cols, seed=0, directed=True, costs=DEFAULT_COSTS):
+    """
+    A rows x cols grid, vertex r * cols + c being linked to its right and lower neighbours
+    :param directed: if True every link is a pair of opposite edges with independent costs
+    """
+    rng = Random(seed)
+    pairs = []
+    for r in range(rows):
+        for c in range(cols):
+            v = r * cols + c
+            if c + 1 < cols:
+                pairs.append((v, v + 1))
+            if r + 1 < rows:
+                pairs.append((v, v + cols))
+    if directed:
+        pairs += [(y, x) for x, y in pairs]
+    return [(x, y, c) for (x, y), c in zip(pairs, _costs(rng, len(pairs), costs))]
+
+
+def dag_edges(n, p, seed=0, costs=DEFAULT_COSTS):
+    """
+    A random directed acyclic graph: the vertices are shuffled into a topological order
+    and every pair of that order gets an edge forwards with probability p
+    """
+    rng = Random(seed)
+    order = list(range(n))
+    rng.shuffle(order)
+    pairs = [_pair_of_index(k) for k in _geometric_indices(rng, n * (n - 1) // 2, p)]
+    return [(order[i], order[j], c) for (i, j), c in zip(pairs, _costs(rng, len(pairs), costs))]
+
+
+def hamiltonian_edges(n, extra_edges, seed=0, costs=DEFAULT_COSTS):
+    """
+    An undirected graph that surely has a Hamiltonian cycle: a cycle through all the
+    vertices in random order (listed first) plus extra_edges other random edges
+    """
+    if n < 3:
+        raise ValueError("A Hamiltonian cycle needs at least 3 vertices!")
+    space = n * (n - 1) // 2
+    if extra_edges > space - n:
+        raise ValueError("Too many edges!")
+    rng = Random(seed)
+    order = list(range(n))
+    rng.shuffle(order)
+    cycle = [(min(x, y), max(x, y)) for x, y in zip(order, order[1:] + order[:1])]
+
+    on_cycle = set(cycle)
+    extra = []
+    for k in rng.sample(range(space), min(space, extra_edges + n)):
+        if len(extra) == extra_edges:
+            break
+        pair = _pair_of_index(k)
+        if pair not in on_cycle:
+            extra.append(pair)
+    pairs = cycle + extra
+    return [(x, y, c) for (x, y), c in zip(pairs, _costs(rng, len(pairs), costs))]
+
+
+def build_graph(graph_class, n, edges):
+    """
+    Returns a graph_class graph on the vertices 0..n-1 with the given edges
+
+    A Graph without add_edges_from (e.g. from an older checkout) gets them one by one.
+    """
+    g = graph_class(n)
+    if not hasattr(g, "add_edges_from"):
+        for x, y, c in edges:
+            g.add_edge(x, y, c)
+        return g
+    _, rejected = g.add_edges_from(edges)
+    if rejected:
+        raise ValueError(rejected[0][1])
+    return g
+
+
+def write_graph_file(filename, n, edges):
+    """
+    Writes the edges in the "n m" text format read by read_graph_from_file
+    """
+    with open(filename, "w") as f:
+        f.write(f"{n} {len(edges)}\n")
+        f.writelines(f"{x} {y} {c}\n" for x, y, c in edges)
+
+
+def activity_name(i):
+    """
+    Returns the name of the i-th activity: A, B, ..., Z, AA, AB, ...
+    """
+    name = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        name = chr(ord("A") + r) + name
+    return name
+
+
+def write_project_file(filename, n, edges, seed=0, durations=(1, 10)):
+    """
+    Writes a DAG as a project file for analyze_project_schedule_from_file: one line
+    "activity duration prerequisites" per vertex, an edge (x, y) making x a prerequisite of y
+    """
+    rng = Random(seed)
+    prerequisites = [[] for _ in range(n)]
+    for x, y, _ in edges:
+        prerequisites[y].append(activity_name(x))
+    with open(filename, "w") as f:
+        for v, duration in zip(range(n), _costs(rng, n, durations)):
+            f.write(f"{activity_name(v)} {duration} {' '.join(prerequisites[v]) or '-'}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("family", choices=["gnp", "power-law", "grid", "dag", "hamiltonian"])
+    parser.add_argument("n", type=int, help="the number of vertices (the number of rows for a grid)")
+    parser.add_argument("--p", type=float, default=0.01, help="edge probability for gnp and dag")
+    parser.add_argument("--m", type=int, default=0, help="number of edges for power-law, extra edges for hamiltonian")
+    parser.add_argument("--cols", type=int, help="number of columns of a grid (default: square)")
+    parser.add_argument("--undirected", action="store_true", help="gnp and grid: undirected edges")
+    parser.add_argument("--project", action="store_true", help="dag: write an assignment-4 project file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    n = args.n
+    if args.family == "gnp":
+        edges = gnp_edges(n, args.p, args.seed, not args.undirected)
+    elif args.family == "power-law":
+        edges = power_law_edges(n, args.m, args.seed)
+    elif args.family == "grid":
+        cols = args.cols or n
+        edges = grid_edges(n, cols, args.seed, not args.undirected)
+        n *= cols
+    elif args.family == "dag":
+        edges = dag_edges(n, args.p, args.seed)
+    else:
+        edges = hamiltonian_edges(n, args.m, args.seed)
+
+    if args.project:
+        write_project_file(args.output, n, edges, args.seed)
+    else:
+        write_graph_file(args.output, n, edges)
+
+
+if __name__ == "__main__":
+    main()
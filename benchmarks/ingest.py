@@ -0,0 +1,47 @@
+"""
+Times building a directed graph edge by edge with Graph.add_edge.
+
+The edges come from a preferential attachment process, so a few hub vertices end up
+with a very large out degree - the case where list based adjacency degrades.
+
+    python -m benchmarks.ingest --vertices 20000 --edges 200000
+    python -m benchmarks.ingest --graph /path/to/old/graph.py
+"""
+import argparse
+import time
+from collections import Counter
+
+from benchmarks.assignments import load_graph_class
+from benchmarks.generators import power_law_edges
+
+
+def time_ingest(graph_class, vertices, edges):
+    """
+    Returns the number of seconds needed to add all the edges to an empty graph
+    """
+    start = time.perf_counter()
+    g = graph_class(vertices)
+    for x, y, c in edges:
+        g.add_edge(x, y, c)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--assignment", type=int, default=1, help="assignment whose Graph is measured")
+    parser.add_argument("--graph", help="explicit graph.py to measure (e.g. from an older checkout)")
+    args = parser.parse_args()
+
+    graph_class = load_graph_class(args.assignment, args.graph)
+    edges = power_law_edges(args.vertices, args.edges, args.seed)
+    max_degree = max(Counter(x for x, _, _ in edges).values())
+    seconds = time_ingest(graph_class, args.vertices, edges)
+    print(f"{args.edges} edges on {args.vertices} vertices (max out degree {max_degree}): "
+          f"{seconds:.3f} s ({args.edges / seconds:,.0f} edges/s)")
+
+
+if __name__ == "__main__":
+    main()
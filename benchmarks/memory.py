@@ -0,0 +1,65 @@
+"""
+Measures the memory used per edge by a Graph and by its frozen CSR copy, with tracemalloc.
+
+    python -m benchmarks.memory --vertices 100000 --edges 1000000
+    python -m benchmarks.memory --graph /path/to/old/graph.py
+"""
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.assignments import load_graph_class
+from benchmarks.generators import gnp_edges
+
+UNDIRECTED = (2, 5)  # the assignments with an undirected Graph
+
+
+def traced_size(build):
+    """
+    Returns the object built by build() and the number of bytes allocated while building it
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=100000)
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--assignment", type=int, default=1, help="assignment whose Graph is measured")
+    parser.add_argument("--graph", help="explicit graph.py to measure (e.g. from an older checkout)")
+    args = parser.parse_args()
+
+    graph_class = load_graph_class(args.assignment, args.graph)
+    n = args.vertices
+    directed = args.assignment not in UNDIRECTED
+    edges = gnp_edges(n, args.edges / (n * (n - 1)) * (1 if directed else 2), args.seed, directed)
+
+    g, size = traced_size(lambda: _build(graph_class, n, edges))
+    m = g.number_of_edges
+    print(f"Graph:       {size / m:7.1f} bytes per edge ({m} edges, {n} vertices)")
+    if hasattr(g, "freeze"):
+        _, size = traced_size(g.freeze)
+        print(f"FrozenGraph: {size / m:7.1f} bytes per edge")
+
+
+def _build(graph_class, n, edges):
+    g = graph_class(n)
+    if hasattr(g, "add_edges_from"):
+        g.add_edges_from(edges)
+    else:
+        for x, y, c in edges:
+            g.add_edge(x, y, c)
+    return g
+
+
+if __name__ == "__main__":
+    main()
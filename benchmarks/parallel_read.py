@@ -0,0 +1,79 @@
+"""
+Times read_graph_from_file against read_graph_from_file_parallel with several worker counts.
+
+The graph file is generated (power-law edges) unless an existing one is given, and every
+parallel result is checked against the serial one.
+
+    python -m benchmarks.parallel_read --vertices 200000 --edges 2000000 --workers 1 2 4 8
+    python -m benchmarks.parallel_read --file big.txt --assignment 2
+    python -m benchmarks.parallel_read --frozen --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.assignments import load_main_module
+from benchmarks.generators import power_law_edges, write_graph_file
+
+
+def timed(function, *args, **kwargs):
+    """
+    Returns the result of function(*args, **kwargs) and the number of seconds it took
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def graph_state(g):
+    """
+    Returns what has to match between two loaded graphs: the vertex and neighbour order and the costs
+    """
+    if hasattr(g, "csr_arrays"):  # a FrozenGraph
+        return str(g), list(g.parse_edges())
+    return str(g), dict(g.costs if hasattr(g, "costs") else g.edges)
+
+
+def read_frozen(module, filename):
+    """
+    Reads a graph file serially into a FrozenGraph
+    """
+    return module.read_graph_from_file(filename).freeze()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=200000)
+    parser.add_argument("--edges", type=int, default=2000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--assignment", type=int, default=1, help="assignment whose main.py is measured")
+    parser.add_argument("--file", help="existing graph file to read instead of a generated one")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--frozen", action="store_true",
+                        help="read into a FrozenGraph (read_graph_from_file_parallel(frozen=True), directed only)")
+    args = parser.parse_args()
+    if args.frozen and args.assignment in (2, 5):
+        parser.error(f"--frozen needs a directed graph, assignment {args.assignment} has no FrozenGraph")
+
+    module = load_main_module(args.assignment)
+    with tempfile.TemporaryDirectory() as folder:
+        filename = args.file
+        if filename is None:
+            filename = os.path.join(folder, "graph.txt")
+            write_graph_file(filename, args.vertices, power_law_edges(args.vertices, args.edges, args.seed))
+
+        if args.frozen:
+            serial, seconds = timed(read_frozen, module, filename)
+        else:
+            serial, seconds = timed(module.read_graph_from_file, filename)
+        print(f"serial:       {seconds:.3f} s")
+        options = {"frozen": True} if args.frozen else {}
+        for workers in sorted(set(args.workers)):
+            g, parallel_seconds = timed(module.read_graph_from_file_parallel, filename, workers, **options)
+            same = "identical" if graph_state(g) == graph_state(serial) else "DIFFERENT"
+            print(f"{workers:2} workers:   {parallel_seconds:.3f} s ({seconds / parallel_seconds:.2f}x, {same})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+Runs the benchmark cases of all the assignments over several graph sizes and compares result files.
+
+Every case builds its input with the seeded generators, so two runs (e.g. of two checkouts)
+time the same work. `run` writes the timings to a JSON file; `compare` lists the cases that
+got slower than the threshold between two such files and exits with status 1 if any did.
+
+    python -m benchmarks.suite run --sizes small medium -o before.json
+    python -m benchmarks.suite run --sizes small medium -o after.json
+    python -m benchmarks.suite compare before.json after.json --threshold 0.1
+    python -m benchmarks.suite run --cases "undirected.*" --repeat 5 -o undirected.json
+"""
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from random import Random
+
+from benchmarks.assignments import load_assignment
+from benchmarks.generators import (build_graph, dag_edges, gnp_edges, hamiltonian_edges, power_law_edges,
+                                   write_project_file)
+
+SIZES = {  # name: (vertices, edges)
+    "small": (1000, 10000),
+    "medium": (10000, 100000),
+    "large": (100000, 1000000),
+}
+HAMILTONIAN_VERTICES = {"small": 16, "medium": 20, "large": 24}  # the search is exponential
+OPERATIONS = 10000  # the number of single operations (add_edge, edge_exists, ...) a case times
+SEARCHES = 5  # the number of Dijkstra searches a case times
+
+CASES = []
+_modules = {}
+
+
+def case(name, sizes=tuple(SIZES), operations=OPERATIONS):
+    """
+    Registers a benchmark case
+    :param name: the name of the case in the results
+    :param sizes: the sizes the case runs at (the slow algorithms skip the large graphs)
+    :param operations: the number of single operations the case times
+
+    The decorated function gets a Workload and the number of operations, and returns a Timing.
+    """
+    def register(function):
+        CASES.append((name, sizes, operations, function))
+        return function
+    return register
+
+
+def main_module(assignment):
+    """
+    Returns the main.py module of an assignment, loaded once per process
+    """
+    if assignment not in _modules:
+        _modules[assignment] = load_assignment(assignment)
+    return _modules[assignment]
+
+
+class Timing:
+    """
+    A function to time, with untimed functions that prepare and restore the shared graphs it changes
+    """
+    def __init__(self, run, setup=None, teardown=None):
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+
+    def measure(self, repeat):
+        """
+        Returns the durations (in seconds) of repeat runs
+        """
+        runs = []
+        for _ in range(repeat):
+            if self.setup is not None:
+                self.setup()
+            start = time.perf_counter()
+            self.run()
+            runs.append(time.perf_counter() - start)
+            if self.teardown is not None:
+                self.teardown()
+        return runs
+
+
+class Workload:
+    """
+    The inputs of the cases at one size, generated on first use and shared by the cases
+    """
+    def __init__(self, size, seed, directory):
+        self.size = size
+        self.vertices, self.edges = SIZES[size]
+        self.seed = seed
+        self.directory = directory
+        self._cache = {}
+
+    def cached(self, key, make):
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    def path(self, filename):
+        return os.path.join(self.directory, f"{self.size}-{filename}")
+
+    def directed_edges(self):
+        return self.cached("directed edges", lambda: power_law_edges(self.vertices, self.edges, self.seed))
+
+    def undirected_edges(self):
+        p = 2 * self.edges / (self.vertices * (self.vertices - 1))
+        return self.cached("undirected edges", lambda: gnp_edges(self.vertices, p, self.seed, directed=False))
+
+    def graph(self, assignment):
+        """
+        Returns the shared graph of an assignment: the directed assignments get the power-law
+        edges, the undirected ones (2 and 5) the G(n, p) edges
+        """
+        edges = self.undirected_edges() if assignment in (2, 5) else self.directed_edges()
+        return self.cached(("graph", assignment),
+                           lambda: build_graph(main_module(assignment).Graph, self.vertices, edges))
+
+    def random_pairs(self, count, salt=0):
+        """
+        Returns count seeded pairs of distinct vertices
+        """
+        rng = Random(self.seed * 1000 + salt)
+        pairs = []
+        while len(pairs) < count:
+            x, y = rng.randrange(self.vertices), rng.randrange(self.vertices)
+            if x != y:
+                pairs.append((x, y))
+        return pairs
+
+    def absent_pairs(self, assignment, count):
+        """
+        Returns count distinct pairs of vertices that are not edges of the shared graph
+        """
+        g = self.graph(assignment)
+        pairs = {}
+        salt = 1
+        while len(pairs) < count:
+            for x, y in self.random_pairs(count, salt):
+                key = (min(x, y), max(x, y)) if assignment in (2, 5) else (x, y)
+                if len(pairs) < count and key not in pairs and not g.edge_exists(x, y):
+                    pairs[key] = (x, y)
+            salt += 1
+        return list(pairs.values())
+
+
+# GRAPH OPERATIONS, ONCE FOR THE DIRECTED (1) AND ONCE FOR THE UNDIRECTED (2) GRAPH
+
+def construct(workload, operations, assignment):
+    edges = workload.undirected_edges() if assignment == 2 else workload.directed_edges()
+    graph_class = main_module(assignment).Graph
+    return Timing(lambda: build_graph(graph_class, workload.vertices, edges))
+
+
+def add_vertex(workload, operations, assignment):
+    g = workload.graph(assignment)
+    new = range(workload.vertices, workload.vertices + operations)
+
+    def run():
+        for v in new:
+            g.add_vertex(v)
+
+    def teardown():
+        for v in new:
+            g.remove_vertex(v)
+    return Timing(run, teardown=teardown)
+
+
+def remove_vertex(workload, operations, assignment):
+    g = workload.graph(assignment)
+    new = range(workload.vertices, workload.vertices + operations)
+    targets = workload.random_pairs(operations)
+
+    def setup():  # every removed vertex has an edge to and an edge from an old vertex
+        for v, (x, y) in zip(new, targets):
+            g.add_vertex(v)
+            g.add_edge(v, x, 1)
+            g.add_edge(y, v, 1)
+
+    def run():
+        for v in new:
+            g.remove_vertex(v)
+    return Timing(run, setup=setup)
+
+
+def add_edge(workload, operations, assignment):
+    g = workload.graph(assignment)
+    pairs = workload.absent_pairs(assignment, operations)
+
+    def run():
+        for x, y in pairs:
+            g.add_edge(x, y, 1)
+
+    def teardown():
+        for x, y in pairs:
+            g.remove_edge(x, y)
+    return Timing(run, teardown=teardown)
+
+
+def remove_edge(workload, operations, assignment):
+    g = workload.graph(assignment)
+    pairs = workload.absent_pairs(assignment, operations)
+
+    def setup():
+        for x, y in pairs:
+            g.add_edge(x, y, 1)
+
+    def run():
+        for x, y in pairs:
+            g.remove_edge(x, y)
+    return Timing(run, setup=setup)
+
+
+def edge_exists(workload, operations, assignment):
+    g = workload.graph(assignment)
+    edges = workload.undirected_edges() if assignment == 2 else workload.directed_edges()
+    rng = Random(workload.seed)
+    present = [(x, y) for x, y, _ in rng.sample(edges, min(len(edges), operations // 2))]
+    queries = present + workload.random_pairs(operations - len(present))  # half hits, half (mostly) misses
+
+    def run():
+        for x, y in queries:
+            g.edge_exists(x, y)
+    return Timing(run)
+
+
+def degree(workload, operations, assignment):
+    g = workload.graph(assignment)
+    vertices = [x for x, _ in workload.random_pairs(operations)]
+
+    if assignment == 2:
+        def run():
+            for v in vertices:
+                g.degree(v)
+    else:
+        def run():
+            for v in vertices:
+                g.incoming_degree(v)
+                g.outgoing_degree(v)
+    return Timing(run)
+
+
+def write_file(workload, operations, assignment):
+    g = workload.graph(assignment)
+    module = main_module(assignment)
+    filename = workload.path(f"write-{assignment}.txt")
+    return Timing(lambda: module.write_graph_to_file(g, filename))
+
+
+def read_file(workload, operations, assignment):
+    module = main_module(assignment)
+    filename = workload.path(f"read-{assignment}.txt")
+    if not os.path.exists(filename):
+        module.write_graph_to_file(workload.graph(assignment), filename)
+    return Timing(lambda: module.read_graph_from_file(filename))
+
+
+def _register_graph_operations():
+    for assignment, kind in ((1, "directed"), (2, "undirected")):
+        for function, operations in ((construct, 1), (add_vertex, OPERATIONS), (remove_vertex, OPERATIONS),
+                                     (add_edge, OPERATIONS), (remove_edge, OPERATIONS), (edge_exists, OPERATIONS),
+                                     (degree, OPERATIONS), (write_file, 1), (read_file, 1)):
+            def bound(workload, operations, function=function, assignment=assignment):
+                return function(workload, operations, assignment)
+            case(f"{kind}.{function.__name__}", operations=operations)(bound)
+
+
+_register_graph_operations()
+
+
+# ALGORITHMS OF THE LATER ASSIGNMENTS
+
+@case("dijkstra.backwards", operations=SEARCHES)
+def backwards_dijkstra(workload, operations):
+    g = workload.graph(3)
+    ui = main_module(3).UI()
+    pairs = workload.random_pairs(operations)
+
+    def run():
+        for x, y in pairs:
+            ui.backwards_dijkstra(g, x, y)
+    return Timing(run)
+
+
+@case("components.connected", operations=1)
+def connected_components(workload, operations):
+    g = workload.graph(2)
+    ui = main_module(2).UI()
+    copies = []
+
+    def setup():  # a fresh copy has no component index yet, so every run builds it from the edges
+        copies[:] = [g.copy_graph()]
+    return Timing(lambda: ui.connected_components_as_graphs(copies[0]), setup=setup)
+
+
+@case("components.same")
+def same_component(workload, operations):
+    g = workload.graph(2)
+    pairs = workload.random_pairs(operations)
+
+    def setup():  # the index is built (or rebuilt after the edge removals of other cases) untimed
+        g.component_sizes()
+
+    def run():
+        for x, y in pairs:
+            g.same_component(x, y)
+    return Timing(run, setup=setup)
+
+
+@case("schedule.analyze", sizes=("small", "medium"), operations=1)
+def project_schedule(workload, operations):
+    module = main_module(4)
+    filename = workload.path("project.txt")
+    if not os.path.exists(filename):
+        edges = dag_edges(workload.vertices, 8 / (workload.vertices - 1), workload.seed)  # 4 prerequisites on average
+        write_project_file(filename, workload.vertices, edges, workload.seed)
+
+    def run():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            module.analyze_project_schedule_from_file(filename)
+    return Timing(run)
+
+
+@case("hamiltonian.cycle", operations=1)
+def hamiltonian_cycle(workload, operations):
+    module = main_module(5)
+    n = HAMILTONIAN_VERTICES[workload.size]
+    g = build_graph(module.Graph, n, hamiltonian_edges(n, n, workload.seed))
+    return Timing(lambda: module.find_hamiltonian_cycle_iterative(g))
+
+
+# RUNNING AND COMPARING
+
+def selected_cases(patterns):
+    """
+    Returns the registered cases whose name matches one of the shell-style patterns
+    """
+    return [c for c in CASES if any(fnmatch.fnmatchcase(c[0], pattern) for pattern in patterns)]
+
+
+def run_suite(sizes, patterns=("*",), repeat=5, seed=0):
+    """
+    Runs the selected cases at the given sizes, printing one line per case
+    :return: the results, keyed by "case[size]"
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            workload = Workload(size, seed, directory)
+            for name, case_sizes, operations, function in selected_cases(patterns):
+                if size not in case_sizes:
+                    continue
+                runs = function(workload, operations).measure(repeat)
+                key = f"{name}[{size}]"
+                results[key] = {"case": name, "size": size, "vertices": workload.vertices, "edges": workload.edges,
+                                "operations": operations, "seconds": min(runs), "runs": runs}
+                print(f"{key:36} {min(runs):10.4f} s  ({min(runs) / operations * 1e6:.1f} us per operation)",
+                      flush=True)
+    return results
+
+
+def compare_results(old, new, threshold, min_seconds=0.001):
+    """
+    Compares the results of two runs case by case
+    :param threshold: the relative slowdown (0.1 = 10%) above which a case is a regression
+    :param min_seconds: cases faster than this in both runs are too noisy to be flagged
+    :return: the keys of the regressed cases
+    """
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["seconds"], new[key]["seconds"]
+        change = after / before - 1 if before else 0.0
+        verdict = ""
+        if max(before, after) >= min_seconds:
+            if change > threshold:
+                verdict = "REGRESSION"
+                regressions.append(key)
+            elif change < -threshold:
+                verdict = "faster"
+        print(f"{key:36} {before:10.4f} s {after:10.4f} s {change:+8.1%}  {verdict}")
+    unmatched = len(old.keys() ^ new.keys())
+    if unmatched:
+        print(f"{unmatched} case(s) only in one of the results (other sizes or cases)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="time the cases and write the results to a JSON file")
+    run.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    run.add_argument("--cases", nargs="+", default=["*"], help="shell-style patterns of the case names")
+    run.add_argument("--repeat", type=int, default=5, help="runs per case; the fastest one is kept")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("-o", "--output", required=True)
+    compare = commands.add_parser("compare", help="flag the cases that got slower between two result files")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.1, help="relative slowdown flagged (default: 10%%)")
+    compare.add_argument("--min-seconds", type=float, default=0.001, help="ignore cases faster than this")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_suite(args.sizes, args.cases, args.repeat, args.seed)
+        document = {
+            "metadata": {
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "sizes": {size: SIZES[size] for size in args.sizes},
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)["results"]
+        with open(args.new) as f:
+            new = json.load(f)["results"]
+        regressions = compare_results(old, new, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
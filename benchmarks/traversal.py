@@ -0,0 +1,57 @@
+"""
+Times a full traversal of a directed graph (every outbound and inbound neighbour of every
+vertex) and measures with tracemalloc the memory allocated by the parse methods meanwhile.
+
+    python -m benchmarks.traversal --vertices 20000 --edges 200000
+    python -m benchmarks.traversal --graph /path/to/old/graph.py
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.assignments import load_graph_class
+from benchmarks.generators import power_law_edges, build_graph
+
+
+def traverse(g):
+    """
+    Visits every neighbour of every vertex and returns the number of visits
+    """
+    visits = 0
+    for v in g.parse_vertices():
+        for _ in g.parse_outbound(v):
+            visits += 1
+        for _ in g.parse_inbound(v):
+            visits += 1
+    return visits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vertices", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="the best of this many runs is reported")
+    parser.add_argument("--assignment", type=int, default=1, help="assignment whose Graph is measured")
+    parser.add_argument("--graph", help="explicit graph.py to measure (e.g. from an older checkout)")
+    args = parser.parse_args()
+
+    g = build_graph(load_graph_class(args.assignment, args.graph), args.vertices,
+                    power_law_edges(args.vertices, args.edges, args.seed))
+
+    seconds = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        traverse(g)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    traverse(g)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"traversal of {args.edges} edges: {seconds:.3f} s, peak allocation {peak / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()